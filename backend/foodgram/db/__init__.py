@@ -0,0 +1,27 @@
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """
+    Открывает соединения воркера до первого запроса: заполняет пулы
+    до POOL_MIN_SIZE, а постоянное соединение (CONN_MAX_AGE)
+    открывает в текущем потоке.
+    """
+    if not settings.DB_WARM_UP:
+        return
+    for connection in connections.all():
+        try:
+            if hasattr(connection, 'fill_pool'):
+                connection.fill_pool()
+            elif connection.settings_dict['CONN_MAX_AGE'] != 0:
+                connection.ensure_connection()
+        except DatabaseError:
+            logger.warning(
+                'Не удалось открыть соединение с базой %s',
+                connection.alias, exc_info=True
+            )
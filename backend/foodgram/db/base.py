@@ -0,0 +1,74 @@
+"""
+PostgreSQL с пулом соединений процесса (ENGINE = 'foodgram.db').
+
+Django закрывает соединение в конце запроса (CONN_MAX_AGE = 0), а этот
+backend вместо закрытия возвращает его в пул, и следующий запрос
+любого потока получает уже открытое соединение. Подходит асинхронным
+воркерам, где постоянные соединения Django привязаны к потокам.
+Размер пула задают POOL_MAX_SIZE, POOL_MIN_SIZE и POOL_TIMEOUT
+в настройках базы.
+"""
+import os
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from monitoring.metrics import record_connection
+from .pool import ConnectionPool, pools, pools_lock
+
+
+def check_connection(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if not connection.autocommit:
+        connection.rollback()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def connection_pool(self):
+        """ Пул процесса; после fork создаётся заново. """
+        with pools_lock:
+            pool = pools.get(self.alias)
+            if pool is None or pool.pid != os.getpid():
+                pool = pools[self.alias] = ConnectionPool(
+                    self.settings_dict.get('POOL_MAX_SIZE', 10),
+                    self.settings_dict.get('POOL_TIMEOUT', 10),
+                    check_connection
+                    if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+                )
+            return pool
+
+    def get_new_connection(self, conn_params):
+        connection, reused = self.connection_pool.acquire(
+            partial(super().get_new_connection, conn_params)
+        )
+        record_connection(self.alias, reused)
+        return connection
+
+    def fill_pool(self):
+        """ Открывает POOL_MIN_SIZE соединений заранее. """
+        with self.wrap_database_errors:
+            self.connection_pool.fill(
+                self.settings_dict.get('POOL_MIN_SIZE', 0),
+                partial(
+                    super().get_new_connection, self.get_connection_params()
+                )
+            )
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        broken = bool(connection.closed)
+        if not broken:
+            try:
+                if connection.get_transaction_status() != (
+                    TRANSACTION_STATUS_IDLE
+                ):
+                    connection.rollback()
+            except self.Database.Error:
+                broken = True
+        self.connection_pool.release(connection, broken)
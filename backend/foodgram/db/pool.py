@@ -0,0 +1,107 @@
+import os
+from collections import deque
+from threading import Condition, Lock
+from time import monotonic
+
+from django.db import OperationalError
+
+# Пулы процесса по alias базы.
+pools = {}
+pools_lock = Lock()
+
+
+class PoolTimeout(OperationalError):
+    """ Свободное соединение не появилось за отведённое время. """
+
+
+class ConnectionPool:
+    """
+    Соединения с одной базой, общие для потоков процесса.
+
+    Открывает не больше max_size соединений, ждёт освобождения занятого
+    до timeout секунд. Вернувшееся соединение выдаётся первым (LIFO),
+    поэтому лишние соединения простаивают и их проще заметить.
+    """
+
+    def __init__(self, max_size, timeout, check=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check = check
+        self.idle = deque()
+        self.size = 0
+        self.opened = 0
+        self.reused = 0
+        self.condition = Condition()
+        self.pid = os.getpid()
+
+    @property
+    def in_use(self):
+        return self.size - len(self.idle)
+
+    def acquire(self, connect):
+        """ Свободное рабочее соединение или новое от connect(). """
+        deadline = monotonic() + self.timeout
+        with self.condition:
+            while True:
+                while self.idle:
+                    connection = self.idle.pop()
+                    if self.usable(connection):
+                        self.reused += 1
+                        return connection, True
+                    self.discard(connection)
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                remaining = deadline - monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    raise PoolTimeout(
+                        f'Нет свободных соединений ({self.max_size}) '
+                        f'за {self.timeout} с'
+                    )
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.opened += 1
+        return connection, False
+
+    def release(self, connection, broken=False):
+        with self.condition:
+            if broken or connection.closed:
+                self.discard(connection)
+            else:
+                self.idle.append(connection)
+            self.condition.notify()
+
+    def fill(self, size, connect):
+        """ Открывает соединения до size (прогрев при старте воркера). """
+        connections = []
+        try:
+            while self.size < min(size, self.max_size):
+                connections.append(self.acquire(connect)[0])
+        finally:
+            for connection in connections:
+                self.release(connection)
+
+    def usable(self, connection):
+        if connection.closed:
+            return False
+        if self.check is None:
+            return True
+        try:
+            self.check(connection)
+        except Exception:
+            return False
+        return True
+
+    def discard(self, connection):
+        """ Закрывает соединение; вызывается под self.condition. """
+        self.size -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,204 @@
+"""
+Чтение с реплик базы данных.
+
+ReplicaMiddleware выбирает для запроса безопасным методом одну из
+реплик DATABASE_REPLICAS, а ReplicaRouter направляет на неё чтение.
+В основную базу идут запись, чтение после записи в том же запросе,
+код вне HTTP-запросов (команды, фоновые задачи) и запросы клиента
+в течение REPLICA_STICKY_SECONDS после его успешного изменяющего
+запроса, чтобы он сразу видел свои изменения. Данные для общих кэшей
+читаются из основной базы (read_from_primary): ответ отстающей реплики
+остался бы в кэше на весь срок хранения.
+"""
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import md5
+from itertools import cycle
+from threading import Lock
+from time import monotonic, time
+
+from asgiref.sync import (async_to_sync, iscoroutinefunction,
+                          markcoroutinefunction, sync_to_async)
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_primary'
+
+_replica = ContextVar('db_replica', default=None)
+# Значение _replica внутри read_from_primary: чтение идёт в default,
+# но после выхода из блока реплика запроса снова используется.
+_PRIMARY = ''
+
+
+@contextmanager
+def read_from_primary():
+    """ Чтение из основной базы внутри блока (заполнение кэшей). """
+    token = _replica.set(_PRIMARY)
+    try:
+        yield
+    finally:
+        # Запись внутри блока закрепляет запрос за основной базой.
+        if _replica.get() == _PRIMARY:
+            _replica.reset(token)
+
+
+class ReplicaRouter:
+    """ Чтение с реплики текущего запроса, запись и миграции в default. """
+
+    def db_for_read(self, model, **hints):
+        return _replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # После записи запрос читает из основной базы.
+        _replica.set(None)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaSet:
+    """
+    Выбор реплики: по кругу (round-robin) или случайно с весами
+    (weighted). Упавшая реплика пропускается REPLICA_RETRY_SECONDS.
+    """
+
+    def __init__(self, weights, balancing):
+        self.weights = weights
+        self.balancing = balancing
+        self.order = cycle(weights)
+        self.lock = Lock()
+        self.down = {}
+
+    def available(self):
+        now = monotonic()
+        return [
+            alias for alias in self.weights if self.down.get(alias, 0) <= now
+        ]
+
+    def choose(self):
+        available = self.available()
+        if not available:
+            return None
+        if self.balancing == 'weighted':
+            return random.choices(
+                available, [self.weights[alias] for alias in available]
+            )[0]
+        with self.lock:
+            while True:
+                alias = next(self.order)
+                if alias in available:
+                    return alias
+
+    def mark_down(self, alias):
+        self.down[alias] = monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+class ReplicaMiddleware:
+    """
+    Выбор реплики для запроса, закрепление клиента за основной базой
+    после записи и повтор запроса в основной базе при сбое реплики.
+
+    Клиент определяется по заголовку Authorization или сессии (метка
+    в кэше) и по cookie db_primary для клиентов без них.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.replicas = ReplicaSet(
+            settings.DATABASE_REPLICAS, settings.REPLICA_BALANCING
+        )
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _replica.set(self.choose(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica.reset(token)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _replica.set(await sync_to_async(self.choose)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica.reset(token)
+        await sync_to_async(self.pin)(request, response)
+        return response
+
+    def choose(self, request):
+        if request.method not in SAFE_METHODS or self.pinned(request):
+            return None
+        return self.replicas.choose()
+
+    @staticmethod
+    def client_key(request):
+        credential = request.headers.get('Authorization') or (
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        )
+        if not credential:
+            return None
+        return 'db:primary:' + md5(credential.encode()).hexdigest()
+
+    def pinned(self, request):
+        try:
+            if float(request.COOKIES.get(PIN_COOKIE, 0)) > time():
+                return True
+        except ValueError:
+            pass
+        key = self.client_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def pin(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        seconds = settings.REPLICA_STICKY_SECONDS
+        response.set_cookie(
+            PIN_COOKIE, str(int(time() + seconds)), max_age=seconds,
+            httponly=True, samesite='Lax'
+        )
+        key = self.client_key(request)
+        if key is not None:
+            cache.set(key, 1, seconds)
+
+    def process_exception(self, request, exception):
+        """ Ошибка базы при чтении с реплики: повтор в основной базе. """
+        alias = _replica.get()
+        if alias is None or not isinstance(exception, DatabaseError):
+            return None
+        logger.warning(
+            'Реплика %s недоступна, запрос %s выполняется в основной базе',
+            alias, request.path, exc_info=exception
+        )
+        self.replicas.mark_down(alias)
+        try:
+            connections[alias].close()
+        except DatabaseError:
+            pass
+        _replica.set(None)
+        match = request.resolver_match
+        view = match.func
+        if iscoroutinefunction(view):
+            view = async_to_sync(view)
+        return view(request, *match.args, **match.kwargs)
@@ -0,0 +1,89 @@
+"""
+JSON-рендерер API.
+
+Если установлен orjson, ответ кодируется им сразу в байты, без
+промежуточной строки. Иначе элементы списков и словаря верхнего уровня
+(страница и её results) кодируются стандартным json по отдельности
+в общий буфер, поэтому строка всего ответа и её байты не лежат
+в памяти одновременно. Ответы с отступами (браузерный интерфейс)
+кодирует JSONRenderer DRF.
+"""
+from io import BytesIO
+
+from rest_framework.compat import SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATORS = (('\u2028', '\\u2028'), ('\u2029', '\\u2029'))
+
+
+def iter_json(data, encode, nested=True):
+    """
+    Части json: элементы списков и значения словаря верхнего уровня
+    (например, results страницы) кодируются по отдельности.
+    """
+    if isinstance(data, (list, tuple)):
+        yield '['
+        for number, item in enumerate(data):
+            if number:
+                yield ','
+            yield encode(item)
+        yield ']'
+    elif nested and isinstance(data, dict) and all(
+        isinstance(key, str) for key in data
+    ):
+        yield '{'
+        for number, (key, value) in enumerate(data.items()):
+            if number:
+                yield ','
+            yield encode(key) + ':'
+            yield from iter_json(value, encode, nested=False)
+        yield '}'
+    else:
+        yield encode(data)
+
+
+def escape_line_separators(content):
+    """ Экранирует U+2028 и U+2029, как JSONRenderer. """
+    for char, escaped in LINE_SEPARATORS:
+        if isinstance(content, bytes):
+            char, escaped = char.encode(), escaped.encode()
+        if char in content:
+            content = content.replace(char, escaped)
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    """ JSONRenderer с orjson и поэлементным кодированием. """
+
+    use_orjson = orjson is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        encoder = self.encoder_class(
+            ensure_ascii=self.ensure_ascii, allow_nan=not self.strict,
+            separators=SHORT_SEPARATORS
+        )
+        if self.use_orjson and not self.ensure_ascii:
+            try:
+                content = orjson.dumps(
+                    data, default=encoder.default,
+                    option=orjson.OPT_PASSTHROUGH_DATETIME
+                )
+            except orjson.JSONEncodeError:
+                # Ключи не строки, целые больше 64 бит: кодирует json.
+                pass
+            else:
+                return escape_line_separators(content)
+        buffer = BytesIO()
+        for chunk in iter_json(data, encoder.encode):
+            buffer.write(escape_line_separators(chunk).encode())
+        return buffer.getvalue()
@@ -34,6 +34,45 @@ MIN_VALUE_COOKING_TIME = 1
 MIN_VALUE_INGREDIENT = 1
 
 PAGE_SIZE = 6
+# Наибольшее число id в одном пакетном запросе (избранное, корзина,
+# подписки).
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', default=100))
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+SHOPPING_CART_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_CART_CACHE_TIMEOUT', default=86400)
+)
+# Перевод единиц в списке покупок: единица -> (основная единица,
+# множитель). Совместимые единицы суммируются в основной.
+SHOPPING_LIST_UNITS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+} if os.getenv(
+    'SHOPPING_LIST_CONVERT_UNITS', default='FALSE'
+).upper() == 'TRUE' else {}
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', default=300))
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+INGREDIENT_SEARCH_FALLBACK = os.getenv(
+    'INGREDIENT_SEARCH_FALLBACK', default='FALSE'
+).upper() == 'TRUE'
+INGREDIENT_SEARCH_TRIGRAM = os.getenv(
+    'INGREDIENT_SEARCH_TRIGRAM', default='FALSE'
+).upper() == 'TRUE'
+INGREDIENT_SEARCH_SIMILARITY = 0.3
+
+# Полнотекстовый поиск рецептов (?search=): на PostgreSQL - tsvector
+# с конфигурацией RECIPE_SEARCH_CONFIG, на других базах - индекс
+# процесса, перестраиваемый не реже раза в RECIPE_SEARCH_INDEX_TTL
+# секунд; в выдаче индекса не больше RECIPE_SEARCH_LIMIT рецептов.
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_INDEX_TTL = int(
+    os.getenv('RECIPE_SEARCH_INDEX_TTL', default=300)
+)
+RECIPE_SEARCH_LIMIT = int(os.getenv('RECIPE_SEARCH_LIMIT', default=500))
 
 LENGTH_OF_FIELDS_USER = 150
 LENGTH_OF_FIELDS_USERNAME = 254
@@ -46,16 +85,21 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
 
     'users.apps.UsersConfig',
-    'recipes.apps.RecipesConfig'
+    'recipes.apps.RecipesConfig',
+    'monitoring.apps.MonitoringConfig',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
+    'monitoring.middleware.RequestInstrumentationMiddleware',
+    'foodgram.db.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,10 +141,129 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST', default='localhost'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='TRUE'
+        ).upper() == 'TRUE',
+        'POOL_MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', default=2)),
+        'POOL_MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+        'POOL_TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=10)),
     }
 }
 
+# Постоянные соединения (CONN_MAX_AGE секунд, 0 - на один запрос)
+# привязаны к потоку воркера. DB_POOL включает пул процесса для
+# PostgreSQL (foodgram.db), общий для потоков: для асинхронных и gthread
+# воркеров. Соединения открываются при старте воркера gunicorn
+# (gunicorn.conf.py), если DB_WARM_UP.
+DB_POOL = os.getenv('DB_POOL', default='FALSE').upper() == 'TRUE'
+if DB_POOL and DATABASES['default']['ENGINE'].endswith('postgresql'):
+    DATABASES['default']['ENGINE'] = 'foodgram.db'
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+DB_WARM_UP = os.getenv('DB_WARM_UP', default='TRUE').upper() == 'TRUE'
+
+# Реплики для чтения: DB_REPLICAS="host[:port][*вес],..." с теми же
+# именем базы и пользователем (для SQLite - пути к файлам, например
+# копия основной базы для локальной проверки). Балансировка
+# REPLICA_BALANCING: round-robin или weighted.
+DATABASE_REPLICAS = {}
+for number, entry in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    address, _, weight = entry.strip().partition('*')
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if 'sqlite' in replica['ENGINE']:
+        replica['NAME'] = address
+    else:
+        replica['HOST'], _, port = address.partition(':')
+        replica['PORT'] = port or replica['PORT']
+    DATABASES[f'replica{number}'] = replica
+    DATABASE_REPLICAS[f'replica{number}'] = int(weight or 1)
+DATABASE_ROUTERS = (
+    ['foodgram.db.routers.ReplicaRouter'] if DATABASE_REPLICAS else []
+)
+REPLICA_BALANCING = os.getenv('REPLICA_BALANCING', default='round-robin')
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=5))
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', default=30))
+
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+if CACHE_BACKEND.endswith(('LocMemCache', 'FileBasedCache', 'DatabaseCache')):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=10000)),
+    }
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', default=86400))
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', default=0))
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', default=86400))
+USER_FLAGS_CACHE_TIMEOUT = int(
+    os.getenv('USER_FLAGS_CACHE_TIMEOUT', default=3600)
+)
+# Сколько документов рецептов (RecipeDocument) собирается за один запрос.
+RECIPE_DOCUMENT_BATCH_SIZE = int(
+    os.getenv('RECIPE_DOCUMENT_BATCH_SIZE', default=500)
+)
+
+# Варианты изображения рецепта: имя и максимальный размер (None - без
+# уменьшения). Создаются в фоне, до готовности отдаётся оригинал.
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (480, 480),
+    'detail': (1280, 1280),
+    'original': None,
+}
+RECIPE_IMAGE_FORMAT = os.getenv('RECIPE_IMAGE_FORMAT', default='WEBP').upper()
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', default=80))
+RECIPE_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+IMAGE_PROCESSING_WORKERS = int(
+    os.getenv('IMAGE_PROCESSING_WORKERS', default=2)
+)
+
+# Веса событий для popularity/trending и период полураспада trending в часах.
+SCORE_FAVORITE_WEIGHT = float(os.getenv('SCORE_FAVORITE_WEIGHT', default=1))
+SCORE_SHOPPING_WEIGHT = float(os.getenv('SCORE_SHOPPING_WEIGHT', default=0.5))
+TRENDING_HALF_LIFE = float(os.getenv('TRENDING_HALF_LIFE', default=72))
+
+# Замеры запросов: Server-Timing, лог monitoring.requests и медленные
+# запросы (от REQUEST_SLOW_THRESHOLD мс) в админке.
+REQUEST_INSTRUMENTATION = os.getenv(
+    'REQUEST_INSTRUMENTATION', default='FALSE'
+).upper() == 'TRUE'
+REQUEST_SLOW_THRESHOLD = float(
+    os.getenv('REQUEST_SLOW_THRESHOLD', default=500)
+)
+REQUEST_NPLUSONE_THRESHOLD = int(
+    os.getenv('REQUEST_NPLUSONE_THRESHOLD', default=5)
+)
+REQUEST_SAMPLES_LIMIT = int(os.getenv('REQUEST_SAMPLES_LIMIT', default=100))
+REQUEST_SAMPLE_MAX_QUERIES = 500
+
+# Метрики Prometheus на /api/metrics. Для нескольких воркеров gunicorn
+# задаётся общий METRICS_DIR: мастер очищает его при старте и сводит
+# файлы завершившихся воркеров в один (gunicorn.conf.py).
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='FALSE').upper() == 'TRUE'
+METRICS_DIR = os.getenv('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=1))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+# Асинхронные представления чтения рецептов и справочников, включаются
+# в asgi.py. Запуск: gunicorn foodgram.asgi:application
+# -k uvicorn.workers.UvicornWorker. Middleware замеров и метрик
+# синхронные: с ними запрос обрабатывается в потоке.
+ASYNC_READ_VIEWS = os.getenv(
+    'ASYNC_READ_VIEWS', default='FALSE'
+).upper() == 'TRUE'
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -111,6 +274,11 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
 
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodgram.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
     'SEARCH_PARAM': 'name',
 }
 
@@ -0,0 +1,108 @@
+import os
+import tempfile
+
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from recipes.models import Tag
+from .db.routers import PIN_COOKIE, ReplicaMiddleware, read_from_primary
+
+REPLICA = 'replica1'
+
+
+@override_settings(
+    DATABASE_REPLICAS={REPLICA: 1},
+    DATABASE_ROUTERS=['foodgram.db.routers.ReplicaRouter']
+)
+class ReplicaRouterTest(TestCase):
+    """
+    Чтение с реплики и закрепление за основной базой после записи.
+
+    Реплика - отдельный файл SQLite, в котором тег называется иначе,
+    чем в основной базе, поэтому по ответу видно, откуда он прочитан.
+    Псевдоним реплики добавляется после проверок и обёрток TestCase
+    и не входит в databases: тестовая база для него не создаётся.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings[REPLICA] = connections.configure_settings({
+            'default': {'ENGINE': 'django.db.backends.sqlite3'},
+            REPLICA: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.replica_dir.name, 'replica.db'),
+            },
+        })[REPLICA]
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(Tag)
+        Tag.objects.using(REPLICA).create(
+            name='Реплика', color='#49B64E', slug='replica'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Основная', color='#E26C2D', slug='primary')
+
+    def run_request(self, method, view, cookies=None):
+        """ Ответ middleware и имена тегов, прочитанные представлением. """
+        names = []
+
+        def get_response(request):
+            names.extend(view())
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/api/tags/')
+        request.COOKIES.update(cookies or {})
+        response = ReplicaMiddleware(get_response)(request)
+        return response, names
+
+    @staticmethod
+    def read():
+        return list(Tag.objects.values_list('name', flat=True))
+
+    def test_unpinned_read_goes_to_replica(self):
+        response, names = self.run_request('get', self.read)
+        self.assertEqual(names, ['Реплика'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_client_to_primary(self):
+        def write():
+            Tag.objects.create(name='Новая', color='#000000', slug='new')
+            return self.read()
+
+        response, names = self.run_request('post', write)
+        self.assertEqual(sorted(names), ['Новая', 'Основная'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        _, names = self.run_request('get', self.read, {
+            PIN_COOKIE: response.cookies[PIN_COOKIE].value
+        })
+        self.assertEqual(sorted(names), ['Новая', 'Основная'])
+
+    def test_cache_fill_reads_primary(self):
+        def read_for_cache():
+            with read_from_primary():
+                names = self.read()
+            return names + self.read()
+
+        _, names = self.run_request('get', read_for_cache)
+        self.assertEqual(names, ['Основная', 'Реплика'])
+
+    def test_write_while_reading_from_primary_pins_request(self):
+        def write_for_cache():
+            with read_from_primary():
+                Tag.objects.create(name='Новая', color='#000000', slug='new')
+            return self.read()
+
+        _, names = self.run_request('get', write_for_cache)
+        self.assertEqual(sorted(names), ['Новая', 'Основная'])
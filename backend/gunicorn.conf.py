@@ -0,0 +1,22 @@
+import os
+
+# Хуки мастера читают настройки Django до загрузки приложения.
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def on_starting(server):
+    """ Файлы метрик прошлого запуска удаляются до старта воркеров. """
+    from monitoring.metrics import registry
+    registry.clear()
+
+
+def post_worker_init(worker):
+    """ Соединения с базой открываются до первого запроса воркера. """
+    from foodgram.db import warm_up
+    warm_up()
+
+
+def child_exit(server, worker):
+    """ Счётчики завершившегося воркера переносятся в общий файл. """
+    from monitoring.metrics import registry
+    registry.retire(worker.pid)
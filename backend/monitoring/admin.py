@@ -0,0 +1,42 @@
+import json
+
+from django.contrib import admin
+from django.utils.html import format_html
+
+from .models import RequestSample
+
+
+@admin.register(RequestSample)
+class RequestSampleAdmin(admin.ModelAdmin):
+    list_display = [
+        'created', 'method', 'path', 'status', 'duration', 'db_time',
+        'serializer_time', 'query_count'
+    ]
+    list_filter = ['method', 'status']
+    search_fields = ['path']
+    fields = [
+        'created', 'method', 'path', 'status', 'duration', 'db_time',
+        'serializer_time', 'query_count', 'get_duplicates', 'get_queries'
+    ]
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Повторяющиеся запросы')
+    def get_duplicates(self, obj):
+        return format_html(
+            '<pre>{}</pre>',
+            json.dumps(obj.duplicates, ensure_ascii=False, indent=2)
+        )
+
+    @admin.display(description='Запросы')
+    def get_queries(self, obj):
+        return format_html('<pre>{}</pre>', '\n\n'.join(
+            f'{query["duration_ms"]} мс [{query["alias"]}]\n'
+            f'{query["sql"]}\n{query["params"]}'
+            for query in obj.queries
+        ))
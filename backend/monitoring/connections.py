@@ -0,0 +1,47 @@
+import os
+from threading import get_ident
+from weakref import WeakSet
+
+from foodgram.db.pool import pools
+
+# Обёртки соединений Django, открывавшиеся в процессе (по одной на поток
+# и базу), и потоки, которые сейчас обрабатывают запрос.
+_wrappers = WeakSet()
+_active_threads = set()
+
+
+def pooled(wrapper):
+    return hasattr(type(wrapper), 'connection_pool')
+
+
+def track(wrapper):
+    _wrappers.add(wrapper)
+
+
+def request_started():
+    _active_threads.add(get_ident())
+
+
+def request_finished():
+    _active_threads.discard(get_ident())
+
+
+def connection_stats():
+    """
+    Открытые и простаивающие соединения процесса.
+
+    Постоянное соединение простаивает, если его поток не обрабатывает
+    запрос; соединение пула — если оно возвращено в пул.
+    """
+    opened = idle = 0
+    for wrapper in list(_wrappers):
+        if pooled(wrapper) or wrapper.connection is None:
+            continue
+        opened += 1
+        if wrapper._thread_ident not in _active_threads:
+            idle += 1
+    for pool in list(pools.values()):
+        if pool.pid == os.getpid():
+            opened += pool.size
+            idle += len(pool.idle)
+    return opened, idle
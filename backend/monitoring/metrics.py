@@ -0,0 +1,368 @@
+import atexit
+import json
+import math
+import os
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf
+)
+# Файл со счётчиками и гистограммами завершившихся воркеров.
+RETIRED = 'retired'
+
+
+class Metric:
+    """ Метрика с метками; значения хранит Registry. """
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.metrics[name] = self
+
+    def key(self, labels):
+        return json.dumps(
+            [self.name, [labels[name] for name in self.labelnames]],
+            ensure_ascii=False
+        )
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            values = self.registry.values
+            values[key] = values.get(key, 0) + amount
+        self.registry.changed()
+
+
+class Gauge(Metric):
+    """
+    Значение процесса; при сборе суммируется по живым процессам.
+    Значение берётся из функции в момент записи или выдачи метрик.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, function):
+        super().__init__(registry, name, documentation)
+        self.function = function
+
+    def collect(self):
+        with self.registry.lock:
+            self.registry.values[self.key({})] = self.function()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(),
+                 buckets=BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            values = self.registry.values
+            # Счётчики по корзинам (не накопительные), затем сумма.
+            state = values.setdefault(key, [0] * (len(self.buckets) + 1))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-1] += value
+        self.registry.changed()
+
+
+class Registry:
+    """
+    Метрики процесса.
+
+    Если задан METRICS_DIR, каждый процесс (воркер gunicorn) не чаще
+    раза в METRICS_FLUSH_INTERVAL секунд записывает свои значения в файл
+    <pid>.json, а выдача метрик складывает файлы всех процессов.
+    Значения завершившихся процессов учитываются для счётчиков и
+    гистограмм и отбрасываются для gauge. Мастер gunicorn очищает
+    каталог при старте и переносит файл завершившегося воркера в общий
+    retired.json (gunicorn.conf.py), поэтому число файлов не растёт
+    при перезапуске воркеров.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.values = {}
+        self.lock = Lock()
+        self.flushed = 0
+
+    @property
+    def directory(self):
+        return settings.METRICS_DIR and Path(settings.METRICS_DIR)
+
+    def changed(self):
+        if (self.directory
+                and monotonic() - self.flushed
+                >= settings.METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+    def gauges(self):
+        return {
+            name for name, metric in self.metrics.items()
+            if isinstance(metric, Gauge)
+        }
+
+    def collect_gauges(self):
+        for metric in self.metrics.values():
+            if isinstance(metric, Gauge):
+                metric.collect()
+
+    def flush(self):
+        """
+        Атомарно записывает значения процесса в его файл. Процесс без
+        значений (мастер gunicorn) файл не создаёт.
+        """
+        directory = self.directory
+        if not directory or not self.values:
+            return
+        self.collect_gauges()
+        self.flushed = monotonic()
+        with self.lock:
+            values = dict(self.values)
+        write_values(directory / f'{os.getpid()}.json', values)
+
+    def clear(self):
+        """ Удаляет файлы процессов, оставшиеся от прошлого запуска. """
+        if not self.directory or not self.directory.exists():
+            return
+        for path in self.directory.iterdir():
+            if path.suffix in ('.json', '.tmp'):
+                path.unlink(missing_ok=True)
+
+    def retire(self, pid):
+        """
+        Переносит счётчики и гистограммы завершившегося процесса в общий
+        файл и удаляет файл процесса. Вызывается только мастером.
+        """
+        if not self.directory:
+            return
+        path = self.directory / f'{pid}.json'
+        values = read_values(path)
+        if values:
+            retired_path = self.directory / f'{RETIRED}.json'
+            retired = read_values(retired_path) or {}
+            gauges = self.gauges()
+            for key, value in values.items():
+                if json.loads(key)[0] not in gauges:
+                    retired[key] = add(retired.get(key), value)
+            write_values(retired_path, retired)
+        path.unlink(missing_ok=True)
+
+    def files(self):
+        """ Значения других процессов и признак, что процесс жив. """
+        if not self.directory or not self.directory.exists():
+            return
+        for path in self.directory.glob('*.json'):
+            pid = None if path.stem == RETIRED else int(path.stem)
+            if pid == os.getpid():
+                continue
+            values = read_values(path)
+            if values is None:
+                continue
+            yield pid, values, pid is not None and process_alive(pid)
+
+    def merged(self):
+        """ Значения всех процессов. """
+        self.collect_gauges()
+        with self.lock:
+            result = dict(self.values)
+        gauges = self.gauges()
+        for pid, values, alive in self.files():
+            for key, value in values.items():
+                if not alive and json.loads(key)[0] in gauges:
+                    continue
+                result[key] = add(result.get(key), value)
+        return result
+
+    def processes(self):
+        """ Значения по работающим процессам: {pid: {ключ: значение}}. """
+        self.collect_gauges()
+        with self.lock:
+            result = {os.getpid(): dict(self.values)}
+        for pid, values, alive in self.files():
+            if alive:
+                result[pid] = values
+        return result
+
+    def render(self):
+        """ Текстовый формат Prometheus 0.0.4. """
+        values = {}
+        for key, value in self.merged().items():
+            name, labels = json.loads(key)
+            values.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for labels, value in sorted(values.get(name, [])):
+                labels = list(zip(metric.labelnames, labels))
+                if metric.kind != 'histogram':
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                total = 0
+                for bound, count in zip(metric.buckets, value):
+                    total += count
+                    lines.append(
+                        f'{name}_bucket'
+                        f'{format_labels(labels + [("le", bound)])} {total}'
+                    )
+                lines.append(f'{name}_sum{format_labels(labels)} {value[-1]}')
+                lines.append(f'{name}_count{format_labels(labels)} {total}')
+        return '\n'.join(lines) + '\n'
+
+
+def add(first, second):
+    if first is None:
+        return second
+    if isinstance(first, list):
+        return [a + b for a, b in zip(first, second)]
+    return first + second
+
+
+def read_values(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_values(path, values):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(values, ensure_ascii=False))
+    os.replace(temporary, path)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, format_value(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    ) + '}'
+
+
+def image_queue_depth():
+    from recipes.images import queue_depth
+    return queue_depth()
+
+
+def open_connections():
+    from .connections import connection_stats
+    return connection_stats()[0]
+
+
+def idle_connections():
+    from .connections import connection_stats
+    return connection_stats()[1]
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+http_requests = Counter(
+    registry, 'foodgram_http_requests_total', 'HTTP requests.',
+    ('method', 'route', 'status')
+)
+http_request_duration = Histogram(
+    registry, 'foodgram_http_request_duration_seconds',
+    'HTTP request duration in seconds.', ('method', 'route')
+)
+db_queries = Counter(
+    registry, 'foodgram_db_queries_total', 'Database queries.',
+    ('route',)
+)
+db_query_duration = Counter(
+    registry, 'foodgram_db_query_duration_seconds_total',
+    'Time spent in database queries.', ('route',)
+)
+cache_requests = Counter(
+    registry, 'foodgram_cache_requests_total',
+    'Application cache lookups by result (hit or miss).',
+    ('cache', 'result')
+)
+shopping_list_export_duration = Histogram(
+    registry, 'foodgram_shopping_list_export_seconds',
+    'Time to generate a shopping list file.', ('format',)
+)
+image_queue = Gauge(
+    registry, 'foodgram_image_queue_depth',
+    'Recipe images waiting for processing.', image_queue_depth
+)
+db_connections = Counter(
+    registry, 'foodgram_db_connections_total',
+    'Database connections by result: opened or reused.', ('alias', 'result')
+)
+db_connections_open = Gauge(
+    registry, 'foodgram_db_connections_open',
+    'Open database connections.', open_connections
+)
+db_connections_idle = Gauge(
+    registry, 'foodgram_db_connections_idle',
+    'Open database connections not serving a request.', idle_connections
+)
+
+
+def record_cache(cache, hits, misses=0):
+    """ Учитывает обращения к кэшу, если метрики включены. """
+    if not settings.METRICS_ENABLED:
+        return
+    if hits:
+        cache_requests.inc(hits, cache=cache, result='hit')
+    if misses:
+        cache_requests.inc(misses, cache=cache, result='miss')
+
+
+def record_connection(alias, reused):
+    """ Учитывает новое или повторно использованное соединение. """
+    if settings.METRICS_ENABLED:
+        db_connections.inc(
+            alias=alias, result='reused' if reused else 'opened'
+        )
+
+
+def timed_export(chunks, file_format):
+    """ Отдаёт части файла и учитывает полное время выгрузки. """
+    if not settings.METRICS_ENABLED:
+        yield from chunks
+        return
+    start = monotonic()
+    yield from chunks
+    shopping_list_export_duration.observe(
+        monotonic() - start, format=file_format
+    )
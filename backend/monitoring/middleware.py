@@ -0,0 +1,224 @@
+import json
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+from rest_framework.serializers import BaseSerializer
+
+from . import metrics
+from .models import RequestSample
+
+logger = logging.getLogger('monitoring.requests')
+
+_stats = ContextVar('request_stats', default=None)
+
+# Списки IN (%s, %s, ...) разной длины считаются одним запросом.
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class RequestStats:
+    """ Запросы к базе и время сериализации одного HTTP-запроса. """
+
+    def __init__(self):
+        self.queries = []
+        self.serializer_time = 0
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((
+                context['connection'].alias, sql, params,
+                perf_counter() - start
+            ))
+
+    @property
+    def db_time(self):
+        return sum(query[3] for query in self.queries)
+
+    def duplicates(self):
+        """
+        Шаблоны запросов, выполненные не меньше REQUEST_NPLUSONE_THRESHOLD
+        раз (признак N+1), и число точных повторов с теми же параметрами.
+        """
+        signatures = Counter(
+            IN_LIST.sub('IN (...)', sql) for _, sql, _, _ in self.queries
+        )
+        exact = Counter(
+            (sql, repr(params)) for _, sql, params, _ in self.queries
+        )
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in signatures.most_common()
+            if count >= settings.REQUEST_NPLUSONE_THRESHOLD
+        ], sum(count - 1 for count in exact.values())
+
+
+def timed_serializer(method):
+    """ Учитывает время внешнего вызова serializer.data в запросе. """
+
+    @wraps(method)
+    def wrapper(self):
+        stats = _stats.get()
+        if stats is None or stats.depth:
+            return method(self)
+        stats.depth += 1
+        start = perf_counter()
+        try:
+            return method(self)
+        finally:
+            stats.depth -= 1
+            stats.serializer_time += perf_counter() - start
+    wrapper.timed = True
+    return wrapper
+
+
+def patch_serializers():
+    if not getattr(BaseSerializer.data.fget, 'timed', False):
+        BaseSerializer.data = property(
+            timed_serializer(BaseSerializer.data.fget)
+        )
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Число и время SQL-запросов, время сериализации и ответа.
+
+    Результат передаётся в заголовке Server-Timing и в лог
+    monitoring.requests, медленные запросы со списком SQL сохраняются
+    в RequestSample. Включается REQUEST_INSTRUMENTATION, при выключенной
+    настройке Django не добавляет middleware в цепочку.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        patch_serializers()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _stats.set(stats)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        duration = perf_counter() - start
+
+        db_time = stats.db_time
+        duplicates, repeated = stats.duplicates()
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_time * 1000:.1f};desc="{len(stats.queries)} queries"',
+            f'serializer;dur={stats.serializer_time * 1000:.1f}',
+            f'app;dur={(duration - db_time) * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ])
+        record = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'db_ms': round(db_time * 1000, 1),
+            'serializer_ms': round(stats.serializer_time * 1000, 1),
+            'queries': len(stats.queries),
+            'repeated_queries': repeated,
+            'nplusone': duplicates,
+        }
+        logger.log(
+            logging.WARNING if duplicates else logging.INFO,
+            json.dumps(record, ensure_ascii=False)
+        )
+        if duration * 1000 >= settings.REQUEST_SLOW_THRESHOLD:
+            self.save_sample(record, stats)
+        return response
+
+    def save_sample(self, record, stats):
+        queries = [
+            {
+                'alias': alias,
+                'sql': sql,
+                'params': repr(params)[:500],
+                'duration_ms': round(duration * 1000, 2),
+            }
+            for alias, sql, params, duration
+            in stats.queries[:settings.REQUEST_SAMPLE_MAX_QUERIES]
+        ]
+        try:
+            sample = RequestSample.objects.create(
+                method=record['method'],
+                path=record['path'][:2000],
+                status=record['status'],
+                duration=record['duration_ms'],
+                db_time=record['db_ms'],
+                serializer_time=record['serializer_ms'],
+                query_count=record['queries'],
+                duplicates=record['nplusone'],
+                queries=queries,
+            )
+            RequestSample.objects.filter(
+                id__lte=sample.id - settings.REQUEST_SAMPLES_LIMIT
+            ).delete()
+        except DatabaseError:
+            logger.exception('Не удалось сохранить медленный запрос')
+
+
+class QueryCounter:
+    """ Число и суммарное время запросов к базе. """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += perf_counter() - start
+
+
+class MetricsMiddleware:
+    """
+    Метрики запросов для /api/metrics: число и длительность ответов
+    по маршрутам, число и время запросов к базе. Включается METRICS_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = perf_counter() - start
+
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        metrics.http_requests.inc(
+            method=request.method, route=route, status=response.status_code
+        )
+        metrics.http_request_duration.observe(
+            duration, method=request.method, route=route
+        )
+        metrics.db_queries.inc(counter.count, route=route)
+        metrics.db_query_duration.inc(counter.duration, route=route)
+        return response
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.5 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=2000, verbose_name='Путь')),
+                ('status', models.PositiveSmallIntegerField(verbose_name='Статус')),
+                ('duration', models.FloatField(verbose_name='Время ответа, мс')),
+                ('db_time', models.FloatField(verbose_name='Время в базе, мс')),
+                ('serializer_time', models.FloatField(verbose_name='Время сериализации, мс')),
+                ('query_count', models.PositiveIntegerField(verbose_name='Запросов к базе')),
+                ('duplicates', models.JSONField(default=list, verbose_name='Повторяющиеся запросы')),
+                ('queries', models.JSONField(default=list, verbose_name='Запросы')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db.models import (CharField, DateTimeField, FloatField, JSONField,
+                              Model, PositiveIntegerField,
+                              PositiveSmallIntegerField)
+
+
+class RequestSample(Model):
+    """
+    Медленный запрос со списком SQL-запросов.
+
+    Таблица работает как кольцевой буфер: хранятся последние
+    REQUEST_SAMPLES_LIMIT записей.
+    """
+
+    created = DateTimeField('Время', auto_now_add=True, db_index=True)
+    method = CharField('Метод', max_length=10)
+    path = CharField('Путь', max_length=2000)
+    status = PositiveSmallIntegerField('Статус')
+    duration = FloatField('Время ответа, мс')
+    db_time = FloatField('Время в базе, мс')
+    serializer_time = FloatField('Время сериализации, мс')
+    query_count = PositiveIntegerField('Запросов к базе')
+    duplicates = JSONField('Повторяющиеся запросы', default=list)
+    queries = JSONField('Запросы', default=list)
+
+    class Meta:
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        ordering = ['-created']
+
+    def __str__(self) -> str:
+        return f'{self.method} {self.path} {self.duration:.0f} мс'
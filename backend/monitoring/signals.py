@@ -0,0 +1,34 @@
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import connections as stats
+from .metrics import record_connection
+
+
+@receiver(connection_created)
+def track_connection(connection, **kwargs):
+    stats.track(connection)
+    if not stats.pooled(connection):
+        record_connection(connection.alias, reused=False)
+
+
+@receiver(request_started)
+def track_request_start(**kwargs):
+    """
+    Запрос начинается с открытым постоянным соединением, если Django
+    не закрыл его по CONN_MAX_AGE (close_old_connections вызывается
+    раньше этого обработчика).
+    """
+    stats.request_started()
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None and not stats.pooled(
+            connection
+        ):
+            record_connection(connection.alias, reused=True)
+
+
+@receiver(request_finished)
+def track_request_finish(**kwargs):
+    stats.request_finished()
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+
+from .metrics import RETIRED, Counter, Gauge, Registry
+
+# Номер процесса, которого заведомо нет.
+DEAD_PID = 2 ** 22 + 1
+
+
+class RegistryFilesTest(SimpleTestCase):
+    """ Файлы процессов в METRICS_DIR: очистка и перенос при выходе. """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(
+            METRICS_DIR=directory.name, METRICS_FLUSH_INTERVAL=3600
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.registry = Registry()
+        self.requests = Counter(self.registry, 'requests', 'Requests.')
+        self.gauge = Gauge(self.registry, 'open', 'Open.', lambda: 1)
+
+    def write_worker(self, pid, requests):
+        (self.directory / f'{pid}.json').write_text(json.dumps({
+            self.requests.key({}): requests, self.gauge.key({}): 1,
+        }))
+
+    def total(self):
+        return self.registry.merged()[self.requests.key({})]
+
+    def test_retire_keeps_counters_and_drops_file(self):
+        for requests in (2, 3):
+            self.write_worker(DEAD_PID, requests)
+            self.registry.retire(DEAD_PID)
+        self.assertEqual(
+            [path.name for path in self.directory.iterdir()],
+            [f'{RETIRED}.json']
+        )
+        self.requests.inc(1)
+        self.assertEqual(self.total(), 6)
+        self.assertEqual(self.registry.merged()[self.gauge.key({})], 1)
+        self.assertEqual(list(self.registry.processes()), [os.getpid()])
+
+    def test_clear_removes_files_of_previous_run(self):
+        self.write_worker(DEAD_PID, 2)
+        self.registry.retire(DEAD_PID)
+        self.write_worker(DEAD_PID + 1, 3)
+        (self.directory / 'other.txt').write_text('')
+        self.registry.clear()
+        self.assertEqual(
+            [path.name for path in self.directory.iterdir()], ['other.txt']
+        )
+
+    def test_process_without_values_writes_no_file(self):
+        self.registry.flush()
+        self.assertEqual(list(self.directory.iterdir()), [])
+        self.requests.inc(1)
+        self.registry.flush()
+        self.assertTrue((self.directory / f'{os.getpid()}.json').exists())
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import connections, metrics
+
+urlpatterns = [
+    path('metrics', metrics, name='metrics'),
+    path('metrics/connections', connections, name='metrics-connections'),
+]
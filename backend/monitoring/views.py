@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from django.http import (Http404, HttpResponse, HttpResponseForbidden,
+                         JsonResponse)
+from django.utils.crypto import constant_time_compare
+
+from .metrics import registry
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Показатели соединений и метрики, из которых они берутся.
+CONNECTION_STATS = {
+    'open': ('foodgram_db_connections_open', None),
+    'idle': ('foodgram_db_connections_idle', None),
+    'opened': ('foodgram_db_connections_total', 'opened'),
+    'reused': ('foodgram_db_connections_total', 'reused'),
+}
+
+
+def check_access(request):
+    """ 404 без METRICS_ENABLED, 403 без токена METRICS_TOKEN. """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.headers.get('Authorization', ''),
+        f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        return HttpResponseForbidden()
+    return None
+
+
+def metrics(request):
+    """ Метрики в текстовом формате Prometheus. """
+    return check_access(request) or HttpResponse(
+        registry.render(), content_type=CONTENT_TYPE
+    )
+
+
+def connections(request):
+    """
+    Соединения с базой по воркерам: открытые и простаивающие сейчас,
+    открытые заново и использованные повторно с запуска воркера.
+    """
+    forbidden = check_access(request)
+    if forbidden:
+        return forbidden
+    workers = []
+    for pid, values in sorted(registry.processes().items()):
+        worker = dict.fromkeys(CONNECTION_STATS, 0)
+        for key, value in values.items():
+            name, labels = json.loads(key)
+            for stat, (metric, result) in CONNECTION_STATS.items():
+                if name == metric and (result is None or labels[-1] == result):
+                    worker[stat] += value
+        workers.append({'pid': pid, **worker})
+    return JsonResponse({'workers': workers})
@@ -1,5 +1,9 @@
+from functools import partial
+
 from django.contrib import admin
+from django.db import transaction
 
+from .cart import invalidate_recipe_carts
 from .forms import IngredientTagInLineFormset
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
                      ShoppingList, Tag)
@@ -45,9 +49,16 @@ class RecipeAdmin(admin.ModelAdmin):
         IngredientsInLine, TagsInline
     )
 
-    @admin.display(description='В избранном')
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            transaction.on_commit(
+                partial(invalidate_recipe_carts, form.instance.id)
+            )
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     @admin.display(description='Теги')
     def get_tags(self, obj):
@@ -0,0 +1,248 @@
+"""
+Асинхронные представления для чтения рецептов и справочников.
+
+Подключаются перед маршрутами роутера при ASYNC_READ_VIEWS. Сами
+обрабатывают только GET с ответом в json; другие методы, форматы,
+постраничный вывод по курсору и ошибки (404, 400, 401) передаются
+синхронным представлениям DRF, поэтому ответы обоих путей совпадают.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from monitoring.metrics import record_cache
+from .cache import aget_user_flags, get_catalog_version, make_key
+from .documents import aget_documents, apply_user_flags
+from .mixins import catalog_response, missing_fragments, ordered_fragments
+from .models import Recipe
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+JSON = 'application/json'
+JSON_TYPES = (JSON, 'application/*', '*/*')
+
+
+def accepts_json(request):
+    """
+    Синхронный путь ответил бы json без параметров рендерера.
+
+    Заголовки с параметрами (indent, q) и с text/html остаются DRF.
+    """
+    if settings.REST_FRAMEWORK.get('URL_FORMAT_OVERRIDE', 'format') in (
+        request.GET
+    ):
+        return False
+    accept = [
+        media.strip()
+        for media in request.headers.get('Accept', '*/*').split(',')
+    ]
+    return (
+        not any(';' in media or media == 'text/html' for media in accept)
+        and any(media in JSON_TYPES for media in accept)
+    )
+
+
+async def authenticate(request):
+    """
+    Пользователь по заголовку Authorization, как в TokenAuthentication.
+
+    None, если токен не принят: ошибку вернёт синхронный путь.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(
+            key=auth[1].decode()
+        )
+    except (UnicodeError, Token.DoesNotExist):
+        return None
+    return token.user if token.user.is_active else None
+
+
+def get_view(viewset, request, user, action, **kwargs):
+    """ Экземпляр viewset для фильтров, пагинации и сериализаторов. """
+    request = Request(request)
+    request.user = user
+    return viewset(
+        request=request, args=(), kwargs=kwargs, format_kwarg=None,
+        action=action
+    )
+
+
+def render(view, data):
+    renderer = next(
+        renderer for renderer in view.get_renderers()
+        if renderer.format == 'json'
+    )
+    content = renderer.render(data, JSON, view.get_renderer_context())
+    return HttpResponse(content, content_type=JSON)
+
+
+async def recipe_fragments(view, ids):
+    """ Асинхронный RecipeCacheMixin.get_recipe_fragments. """
+    keys = await sync_to_async(view.get_fragment_keys)(ids)
+    fragments = await cache.aget_many(keys.values())
+    missing = missing_fragments(keys, fragments)
+    if missing:
+        documents = view.document_fragments(
+            await aget_documents(missing), keys
+        )
+        await cache.aset_many(documents, settings.RECIPE_CACHE_TIMEOUT)
+        fragments.update(documents)
+    return ordered_fragments(keys, fragments)
+
+
+async def fetch(queryset):
+    return [row async for row in queryset]
+
+
+async def user_flags(user):
+    if user.is_anonymous:
+        return None
+    return await aget_user_flags(user)
+
+
+async def list_recipes(request, user):
+    if 'cursor' in request.GET:
+        return None
+    view = get_view(RecipeViewSet, request, user, 'list')
+    try:
+        queryset = await sync_to_async(view.filter_queryset)(
+            Recipe.objects.annotate_user_flags(user)
+        )
+    except ValidationError:
+        return None
+    queryset = queryset.values('id', 'created')
+
+    pagination = view.paginator
+    page_size = pagination.get_page_size(view.request)
+    number = request.GET.get(pagination.page_query_param, '1')
+    if not number.isdigit() or int(number) < 1:
+        return None
+    number = int(number)
+    offset = (number - 1) * page_size
+    count, rows, flags = await asyncio.gather(
+        queryset.acount(),
+        fetch(queryset[offset:offset + page_size]),
+        user_flags(user),
+    )
+    paginator = Paginator((), page_size)
+    paginator.count = count
+    try:
+        paginator.validate_number(number)
+    except InvalidPage:
+        return None
+
+    data = await recipe_fragments(view, [row['id'] for row in rows])
+    if flags is not None:
+        data = apply_user_flags(data, flags)
+    pagination.request = view.request
+    pagination.page = Page(rows, number, paginator)
+    return render(view, pagination.get_paginated_response(data).data)
+
+
+async def retrieve_recipe(request, user, pk):
+    if request.GET:
+        return None
+    view = get_view(RecipeViewSet, request, user, 'retrieve', pk=pk)
+    data, flags = await asyncio.gather(
+        recipe_fragments(view, [int(pk)]), user_flags(user)
+    )
+    if not data:
+        return None
+    if flags is not None:
+        data = apply_user_flags(data, flags)
+    return render(view, data[0])
+
+
+def catalog(basename, action):
+    """
+    Ответ справочника из кэша CatalogCacheMixin. При промахе ответ
+    строит и кэширует синхронный путь.
+    """
+
+    async def handler(request, user, pk=None):
+        version = await sync_to_async(get_catalog_version)()
+        entry = await cache.aget(make_key(
+            'catalog', version, basename, action, pk, JSON,
+            query=request.GET
+        ))
+        if entry is None:
+            return None
+        record_cache('catalog', 1)
+        return catalog_response(request, entry, version, JSON)
+
+    return handler
+
+
+def read_view(viewset, actions, basename, detail, handler):
+    """
+    Асинхронное представление с запасным синхронным viewset.
+
+    handler возвращает ответ или None, если запрос нужно передать DRF.
+    Заголовки Allow и Vary те же, что добавляет APIView.
+    """
+    sync_view = viewset.as_view(
+        dict(actions), basename=basename, detail=detail,
+        suffix='Instance' if detail else 'List'
+    )
+    allow = ', '.join(
+        method.upper() for method in viewset.http_method_names
+        if method in actions or method == 'options'
+        or method == 'head' and 'get' in actions
+    )
+
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET' and accepts_json(request):
+            user = await authenticate(request)
+            response = None
+            if user is not None:
+                response = await handler(request, user, *args, **kwargs)
+            if response is not None:
+                response['Allow'] = allow
+                patch_vary_headers(response, ['Accept'])
+                return response
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    # Атрибуты as_view нужны хлебным крошкам Browsable API и схемам.
+    view.cls = sync_view.cls
+    view.initkwargs = sync_view.initkwargs
+    view.actions = sync_view.actions
+    view.csrf_exempt = True
+    return view
+
+
+LIST = {'get': 'list', 'post': 'create'}
+DETAIL = {
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy',
+}
+
+recipe_list = read_view(RecipeViewSet, LIST, 'recipes', False, list_recipes)
+recipe_detail = read_view(
+    RecipeViewSet, DETAIL, 'recipes', True, retrieve_recipe
+)
+ingredient_list = read_view(
+    IngredientViewSet, {'get': 'list'}, 'ingredients', False,
+    catalog('ingredients', 'list')
+)
+ingredient_detail = read_view(
+    IngredientViewSet, {'get': 'retrieve'}, 'ingredients', True,
+    catalog('ingredients', 'retrieve')
+)
+tag_list = read_view(TagViewSet, LIST, 'tags', False, catalog('tags', 'list'))
+tag_detail = read_view(
+    TagViewSet, DETAIL, 'tags', True, catalog('tags', 'retrieve')
+)
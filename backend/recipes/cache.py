@@ -0,0 +1,131 @@
+import asyncio
+from hashlib import md5
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import urlencode
+
+from foodgram.db.routers import read_from_primary
+from monitoring.metrics import record_cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def _now():
+    return int(time() * 1000)
+
+
+def get_catalog_version():
+    """
+    Версия справочников (теги и ингредиенты) и время её изменения.
+
+    Версия входит в ключи кэша, поэтому после её смены старые ответы
+    больше не используются. Начальное значение берётся из текущего
+    времени, чтобы после очистки кэша версия не повторилась.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = _now()
+        if not cache.add(CATALOG_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, _now(), timeout=None)
+
+
+def make_key(prefix, *parts, query=None):
+    raw = ':'.join(str(part) for part in parts)
+    if query is not None:
+        raw += '?' + urlencode(sorted(query.lists()), doseq=True)
+    return f'{prefix}:{md5(raw.encode()).hexdigest()}'
+
+
+def recipe_version_key(recipe_id):
+    return f'recipe:version:{recipe_id}'
+
+
+def get_recipe_versions(recipe_ids):
+    """ Версии рецептов; отсутствующие в кэше получают новую версию. """
+    keys = {recipe_version_key(recipe_id): recipe_id
+            for recipe_id in recipe_ids}
+    versions = cache.get_many(keys)
+    missing = {key: _now() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_recipe_versions(recipe_ids):
+    version = _now()
+    cache.set_many(
+        {recipe_version_key(recipe_id): version for recipe_id in recipe_ids},
+        timeout=None
+    )
+
+
+def user_flags_key(user_id):
+    return f'user:flags:{user_id}'
+
+
+def get_user_flags(user):
+    """
+    Множества id рецептов в избранном и в корзине пользователя
+    и id авторов, на которых он подписан.
+    """
+    key = user_flags_key(user.id)
+    flags = cache.get(key)
+    record_cache('user_flags', flags is not None, flags is None)
+    if flags is None:
+        with read_from_primary():
+            flags = {
+                'favorites': set(
+                    user.favorites.values_list('recipe_id', flat=True)
+                ),
+                'shopping': set(
+                    user.shopping.values_list('recipe_id', flat=True)
+                ),
+                'subscriptions': set(
+                    user.subscriber.values_list('author_id', flat=True)
+                ),
+            }
+        cache.set(key, flags, settings.USER_FLAGS_CACHE_TIMEOUT)
+    return flags
+
+
+async def aget_user_flags(user):
+    """ Асинхронный get_user_flags: три выборки идут одновременно. """
+    key = user_flags_key(user.id)
+    flags = await cache.aget(key)
+    record_cache('user_flags', flags is not None, flags is None)
+    if flags is None:
+        with read_from_primary():
+            favorites, shopping, subscriptions = await asyncio.gather(
+                values_set(
+                    user.favorites.values_list('recipe_id', flat=True)
+                ),
+                values_set(
+                    user.shopping.values_list('recipe_id', flat=True)
+                ),
+                values_set(
+                    user.subscriber.values_list('author_id', flat=True)
+                ),
+            )
+        flags = {
+            'favorites': favorites,
+            'shopping': shopping,
+            'subscriptions': subscriptions,
+        }
+        await cache.aset(key, flags, settings.USER_FLAGS_CACHE_TIMEOUT)
+    return flags
+
+
+async def values_set(queryset):
+    return {value async for value in queryset}
+
+
+def invalidate_user_flags(user):
+    cache.delete(user_flags_key(user.id))
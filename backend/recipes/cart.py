@@ -0,0 +1,133 @@
+"""
+Итоги списка покупок пользователя.
+
+В кэше хранится вклад каждого рецепта корзины ({ingredient_id: amount})
+и их сумма. Добавление и удаление рецепта меняют сумму на вклад этого
+рецепта без пересчёта корзины, изменение ингредиентов рецепта сбрасывает
+итоги пользователей, у которых он в корзине (recipes.signals). Итоги
+сверяются с рецептами корзины из get_user_flags и при расхождении,
+например после одновременных изменений, пересчитываются одним запросом.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.db.routers import read_from_primary
+from monitoring.metrics import record_cache
+from .cache import get_user_flags
+from .models import Ingredient, RecipeIngredient, ShoppingList
+from .search import ingredient_index
+
+
+def cart_key(user_id):
+    return f'user:cart:{user_id}'
+
+
+def change_totals(totals, contribution, sign):
+    for ingredient_id, amount in contribution.items():
+        total = totals.get(ingredient_id, 0) + sign * amount
+        if total:
+            totals[ingredient_id] = total
+        else:
+            totals.pop(ingredient_id, None)
+
+
+def recipe_contributions(recipe_ids):
+    contributions = {recipe_id: {} for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id, amount in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id', 'amount'):
+        contribution = contributions[recipe_id]
+        contribution[ingredient_id] = (
+            contribution.get(ingredient_id, 0) + amount
+        )
+    return contributions
+
+
+def build_cart(recipe_ids):
+    recipes = recipe_contributions(recipe_ids)
+    totals = {}
+    for contribution in recipes.values():
+        change_totals(totals, contribution, 1)
+    return {'recipes': recipes, 'totals': totals}
+
+
+def get_cart(user):
+    """ Итоги корзины: {'recipes': вклады рецептов, 'totals': сумма}. """
+    shopping = get_user_flags(user)['shopping']
+    key = cart_key(user.id)
+    entry = cache.get(key)
+    hit = entry is not None and entry['recipes'].keys() == shopping
+    record_cache('cart', hit, not hit)
+    if not hit:
+        with read_from_primary():
+            entry = build_cart(shopping)
+        cache.set(key, entry, settings.SHOPPING_CART_CACHE_TIMEOUT)
+    return entry
+
+
+def add_to_cart(user_id, recipe_ids):
+    """ Прибавляет к итогам вклад добавленных рецептов. """
+    key = cart_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        return
+    recipe_ids = [pk for pk in recipe_ids if pk not in entry['recipes']]
+    if not recipe_ids:
+        return
+    for recipe_id, contribution in recipe_contributions(recipe_ids).items():
+        entry['recipes'][recipe_id] = contribution
+        change_totals(entry['totals'], contribution, 1)
+    cache.set(key, entry, settings.SHOPPING_CART_CACHE_TIMEOUT)
+
+
+def remove_from_cart(user_id, recipe_ids):
+    """ Вычитает из итогов сохранённые вклады удалённых рецептов. """
+    key = cart_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        return
+    recipe_ids = [pk for pk in recipe_ids if pk in entry['recipes']]
+    if not recipe_ids:
+        return
+    for recipe_id in recipe_ids:
+        change_totals(entry['totals'], entry['recipes'].pop(recipe_id), -1)
+    cache.set(key, entry, settings.SHOPPING_CART_CACHE_TIMEOUT)
+
+
+def invalidate_recipe_carts(recipe_id):
+    """ Сбрасывает итоги пользователей, у которых рецепт в корзине. """
+    cache.delete_many([
+        cart_key(user_id) for user_id in ShoppingList.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)
+    ])
+
+
+def get_shopping_list(user):
+    return shopping_list(get_cart(user)['totals'])
+
+
+def shopping_list(totals):
+    """
+    Строки списка покупок (name, measurement_unit, total) по названию.
+    Единицы из SHOPPING_LIST_UNITS переводятся в основные и суммируются.
+    """
+    ingredients = ingredient_index.get_many(totals)
+    if len(ingredients) < len(totals):
+        ingredients.update(Ingredient.objects.in_bulk(
+            [pk for pk in totals if pk not in ingredients]
+        ))
+    merged = {}
+    for ingredient_id, amount in totals.items():
+        ingredient = ingredients.get(ingredient_id)
+        if ingredient is None:
+            continue
+        unit, factor = settings.SHOPPING_LIST_UNITS.get(
+            ingredient.measurement_unit, (ingredient.measurement_unit, 1)
+        )
+        key = (ingredient.name, unit)
+        merged[key] = merged.get(key, 0) + amount * factor
+    return [
+        {'name': name, 'measurement_unit': unit, 'total': total}
+        for (name, unit), total in sorted(merged.items())
+    ]
@@ -0,0 +1,17 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def actual_count(model, relation):
+    """ Подзапрос с фактическим числом связанных объектов. """
+    field = model._meta.get_field(relation)
+    related = field.related_model
+    name = field.field.name
+    return Coalesce(
+        Subquery(
+            related.objects.filter(**{name: OuterRef('pk')})
+            .order_by().values(name)
+            .annotate(count=Count('pk')).values('count')
+        ),
+        0
+    )
@@ -0,0 +1,115 @@
+"""
+Документы рецептов: готовый json RecipeSerializer без флагов
+пользователя (recipes.projections) в таблице RecipeDocument.
+
+Документ пересобирается после фиксации транзакции, изменившей рецепт,
+его ингредиенты, теги или профиль автора (recipes.signals); вызовы
+в одной транзакции объединяются. Отсутствующий документ собирается
+при первом чтении. Ссылки на изображения хранятся относительными
+и дополняются адресом сервера при чтении. Документы читаются и
+собираются из основной базы: их кладут в кэш рецептов.
+"""
+from threading import local
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from foodgram.db.routers import read_from_primary
+from .cache import bump_recipe_versions
+from .models import RecipeDocument
+from .projections import recipe_documents
+
+_pending = local()
+
+
+def build_documents(recipe_ids, batch_size=None):
+    """ Собирает и сохраняет документы рецептов, возвращает их по id. """
+    recipe_ids = list(recipe_ids)
+    documents = {}
+    batch_size = batch_size or settings.RECIPE_DOCUMENT_BATCH_SIZE
+    for start in range(0, len(recipe_ids), batch_size):
+        with read_from_primary():
+            batch = recipe_documents(recipe_ids[start:start + batch_size])
+        RecipeDocument.objects.bulk_create(
+            [RecipeDocument(recipe_id=pk, data=data)
+             for pk, data in batch.items()],
+            update_conflicts=True, unique_fields=['recipe'],
+            update_fields=['data', 'updated']
+        )
+        documents.update(batch)
+    # Кэш мог заполниться старым документом между изменением
+    # рецепта и пересборкой.
+    bump_recipe_versions(documents)
+    return documents
+
+
+def schedule_documents(recipe_ids):
+    """ Пересборка документов после фиксации текущей транзакции. """
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.update(recipe_ids)
+    transaction.on_commit(flush_documents)
+
+
+def flush_documents():
+    recipe_ids = getattr(_pending, 'ids', None)
+    _pending.ids = None
+    if recipe_ids:
+        build_documents(recipe_ids)
+
+
+def get_documents(recipe_ids):
+    """ Документы рецептов по id; отсутствующие собираются сразу. """
+    with read_from_primary():
+        documents = dict(RecipeDocument.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'data'))
+    missing = [pk for pk in recipe_ids if pk not in documents]
+    if missing:
+        documents.update(build_documents(missing))
+    return documents
+
+
+def current_documents(recipe_ids):
+    """
+    Документы рецептов с учётом изменений текущей транзакции:
+    ожидающие пересборки собираются заново без сохранения.
+    """
+    pending = getattr(_pending, 'ids', None) or set()
+    documents = get_documents(
+        [pk for pk in recipe_ids if pk not in pending]
+    )
+    changed = [pk for pk in recipe_ids if pk in pending]
+    if changed:
+        documents.update(recipe_documents(changed))
+    return documents
+
+
+async def aget_documents(recipe_ids):
+    with read_from_primary():
+        documents = {
+            pk: data async for pk, data in RecipeDocument.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', 'data')
+        }
+    missing = [pk for pk in recipe_ids if pk not in documents]
+    if missing:
+        documents.update(await sync_to_async(build_documents)(missing))
+    return documents
+
+
+def apply_user_flags(fragments, flags):
+    """ Подставляет в рецепты флаги пользователя из get_user_flags. """
+    data = []
+    for fragment in fragments:
+        recipe = dict(fragment)
+        recipe['author'] = dict(
+            recipe['author'],
+            is_subscribed=recipe['author']['id'] in flags['subscriptions']
+        )
+        recipe['is_favorited'] = recipe['id'] in flags['favorites']
+        recipe['is_in_shopping_cart'] = recipe['id'] in flags['shopping']
+        data.append(recipe)
+    return data
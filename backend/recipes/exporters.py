@@ -0,0 +1,79 @@
+import csv
+
+from django.conf import settings
+
+from .pdf import PDFDocument
+
+TITLE = 'Список покупок'
+
+
+class Echo:
+    """ Псевдо-буфер для потоковой записи csv. """
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListExporter:
+    """ Базовый класс выгрузки списка покупок. """
+
+    extension = None
+    content_type = None
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def lines(self):
+        for row in self.rows:
+            yield (
+                f"{row['name']} ({row['measurement_unit']}) — "
+                f"{row['total']}"
+            )
+
+    def __iter__(self):
+        raise NotImplementedError
+
+
+class TxtExporter(ShoppingListExporter):
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def __iter__(self):
+        yield f'{TITLE}:\n'
+        for line in self.lines():
+            yield f'{line}\n'
+
+
+class CsvExporter(ShoppingListExporter):
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def __iter__(self):
+        writer = csv.writer(Echo())
+        yield '\ufeff' + writer.writerow(
+            ['Ингредиент', 'Единица измерения', 'Количество']
+        )
+        for row in self.rows:
+            yield writer.writerow(
+                [row['name'], row['measurement_unit'], row['total']]
+            )
+
+
+class PdfExporter(ShoppingListExporter):
+    extension = 'pdf'
+    content_type = 'application/pdf'
+
+    def __iter__(self):
+        document = PDFDocument(settings.SHOPPING_LIST_FONT)
+        return document.render(self._document_lines())
+
+    def _document_lines(self):
+        yield f'{TITLE}:'
+        yield ''
+        yield from self.lines()
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (PdfExporter, TxtExporter, CsvExporter)
+}
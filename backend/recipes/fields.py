@@ -1,17 +1,72 @@
 import base64
 
 import webcolors
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
 from rest_framework import serializers
 
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Изображение в base64.
+
+    В запросе читается только заголовок файла: формат и размер.
+    Полное декодирование и уменьшение выполняются в фоне (recipes.images).
+    """
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        file = serializers.FileField.to_internal_value(self, data)
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        if image_format not in settings.RECIPE_IMAGE_FORMATS:
+            self.fail('invalid_image')
+        file.seek(0)
+        return file
+
+
+def variant_urls(image, variants):
+    """ Ссылки на варианты изображения без адреса сервера. """
+    if not image:
+        return None
+    variants = variants or {}
+    if variants.get('source') != image:
+        variants = {}
+    return {
+        name: default_storage.url(variants.get(name, image))
+        for name in settings.RECIPE_IMAGE_VARIANTS
+    }
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Ссылки на варианты изображения рецепта.
+
+    Пока варианты не созданы, для каждого отдаётся оригинал.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        urls = variant_urls(recipe.image.name, recipe.image_variants)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+        return {
+            name: request.build_absolute_uri(url)
+            for name, url in urls.items()
+        }
 
 
 class Hex2NameColor(serializers.Field):
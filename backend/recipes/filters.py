@@ -1,15 +1,19 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
 
-from .models import Recipe, Tag
+from .models import Recipe, RecipeTag, Tag
+from .search import ingredient_index, recipe_search
 
 
 class RecipeFilter(filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name='tags__slug',
-        to_field_name='slug'
+        to_field_name='slug',
+        method='get_tags'
     )
+    search = filters.CharFilter(method='get_search')
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
@@ -18,19 +22,83 @@ class RecipeFilter(filters.FilterSet):
     class Meta:
         model = Recipe
         fields = [
-            'tags', 'author', 'is_favorited', 'is_in_shopping_cart'
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search'
         ]
 
+    def get_tags(self, queryset, name, value):
+        """ Фильтр через EXISTS: без JOIN и повторов рецептов. """
+        if not value:
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
+
+    def get_search(self, queryset, name, value):
+        """ Полнотекстовый поиск по названию, ингредиентам и описанию. """
+        return recipe_search.search(queryset, value)
+
     def get_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
 
-class IngredientFilter(SearchFilter):
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Сортировка рецептов.
+
+    popularity и trending берутся из индексированной таблицы RecipeScore.
+    При поиске без явной сортировки рецепты идут по релевантности.
+    Для однозначного порядка в конец добавляется ключ рецепта.
+    """
+
+    aliases = {
+        'popularity': 'score__popularity',
+        'trending': 'score__trending',
+    }
+
+    def get_ordering(self, request, queryset, view):
+        if ('search_rank' in queryset.query.annotations
+                and not request.query_params.get(self.ordering_param)):
+            return ['-search_rank', '-id']
+        ordering = []
+        for field in super().get_ordering(request, queryset, view) or ():
+            name = field.lstrip('-')
+            ordering.append(
+                field[:len(field) - len(name)] + self.aliases.get(name, name)
+            )
+        if ordering and ordering[-1].lstrip('-') not in ('id', 'pk'):
+            # Для полей RecipeScore ключ берётся из той же таблицы и в том
+            # же направлении, чтобы сортировка целиком шла по её индексу.
+            last = ordering[-1]
+            ordering.append(
+                last[:len(last) - len(last.lstrip('-'))] + 'score__recipe_id'
+                if last.lstrip('-') in self.aliases.values() else '-id'
+            )
+        return ordering
+
+    def filter_queryset(self, request, queryset, view):
+        queryset = super().filter_queryset(request, queryset, view)
+        if any('score__' in field for field in queryset.query.order_by):
+            # У каждого рецепта есть строка RecipeScore (сигнал при
+            # создании, update_scores для остальных), поэтому INNER JOIN
+            # не теряет рецепты и позволяет начать с индекса RecipeScore.
+            queryset = queryset.filter(score__isnull=False)
+        return queryset
+
+
+class IngredientFilter(BaseFilterBackend):
+    """ Поиск ингредиентов по началу названия для автодополнения. """
+
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name or view.action != 'list':
+            return queryset
+        return ingredient_index.search(name)
@@ -0,0 +1,113 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+from .documents import schedule_documents
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/images/variants'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+_executor = None
+_executor_lock = Lock()
+_pending = 0
+
+
+def queue_depth():
+    """ Количество изображений в очереди на обработку. """
+    return _pending
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                    thread_name_prefix='recipe-images'
+                )
+    return _executor
+
+
+def schedule_image_processing(recipe_id):
+    """ Ставит изображение рецепта в очередь на обработку. """
+    global _pending
+    if settings.IMAGE_PROCESSING_WORKERS <= 0:
+        process_recipe_image(recipe_id)
+        return
+    with _executor_lock:
+        _pending += 1
+    get_executor().submit(_run, recipe_id)
+
+
+def _run(recipe_id):
+    global _pending
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        with _executor_lock:
+            _pending -= 1
+        connections.close_all()
+
+
+def render_variant(image, size):
+    """ Уменьшенная копия изображения без метаданных. """
+    image_format = settings.RECIPE_IMAGE_FORMAT
+    variant = image.copy()
+    if size:
+        variant.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' or variant.mode not in ('RGB', 'RGBA'):
+        variant = variant.convert('RGB' if image_format == 'JPEG' else 'RGBA')
+    buffer = BytesIO()
+    variant.save(
+        buffer, format=image_format, quality=settings.RECIPE_IMAGE_QUALITY
+    )
+    return buffer.getvalue()
+
+
+def process_recipe_image(recipe_id):
+    """
+    Создаёт варианты изображения рецепта (миниатюра для списка,
+    изображение для страницы рецепта и перекодированный оригинал)
+    и сохраняет их имена в Recipe.image_variants.
+    """
+    try:
+        source = Recipe.objects.values_list(
+            'image', flat=True
+        ).get(pk=recipe_id)
+    except Recipe.DoesNotExist:
+        return
+    if not source:
+        return
+    try:
+        with default_storage.open(source, 'rb') as file:
+            with Image.open(file) as image:
+                image = ImageOps.exif_transpose(image)
+                image.load()
+    except (OSError, Image.DecompressionBombError):
+        logger.exception('Не удалось открыть изображение %s', source)
+        return
+
+    stem = PurePosixPath(source).stem
+    extension = EXTENSIONS[settings.RECIPE_IMAGE_FORMAT]
+    variants = {'source': source}
+    for name, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        variants[name] = default_storage.save(
+            f'{VARIANTS_DIR}/{stem}_{name}.{extension}',
+            ContentFile(render_variant(image, size))
+        )
+    if Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=variants
+    ):
+        schedule_documents([recipe_id])
@@ -0,0 +1,550 @@
+import base64
+import io
+import json
+import random
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, resolve
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingList, Tag)
+from users.models import Subscription, User
+
+PASSWORD = 'bench-password'
+IMAGE = 'recipes/images/bench.png'
+# Сколько объектов передаётся в массовые запросы.
+BULK_SIZE = 10
+
+# Окружение замера: отдельный кэш, медиа во временной папке, быстрый хэш
+# паролей и синхронная обработка изображений (тестовая база SQLite живёт
+# в памяти и недоступна из других потоков).
+BENCH_SETTINGS = {
+    'CACHES': {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench',
+    }},
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    'IMAGE_PROCESSING_WORKERS': 0,
+}
+
+
+class Endpoint:
+    """ Запрос к API, который замеряется. """
+
+    def __init__(self, name, method, path, user=None, data=None,
+                 setup=None, status=200):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.user = user
+        self.data = data
+        self.setup = setup
+        self.status = status
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, min(len(values) - 1,
+                       round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def url_patterns(resolver=None, prefix=''):
+    """
+    Маршруты API в том виде, в каком их возвращает resolve().route.
+    Варианты с суффиксом формата (.json) не учитываются.
+    """
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern).lstrip('^')
+        if isinstance(pattern, URLResolver):
+            yield from url_patterns(pattern, route)
+        elif (isinstance(pattern, URLPattern) and route.startswith('api/')
+              and '(?P<format>' not in route):
+            yield route
+
+
+def add_dataset_arguments(parser, **defaults):
+    """ Размеры синтетических данных для seed_dataset. """
+    for name, default in (
+        ('users', 20), ('recipes-per-user', 5), ('favorites-per-user', 10),
+        ('carts-per-user', 5), ('subscriptions-per-user', 5),
+        ('ingredients-per-recipe', 6), ('seed', 0),
+    ):
+        parser.add_argument(
+            f'--{name}', type=int,
+            default=defaults.get(name.replace('-', '_'), default)
+        )
+    parser.add_argument(
+        "--data-dir", type=str,
+        default=str(Path(settings.BASE_DIR).parent / 'data'),
+        help="directory with ingredients.json and tags.json"
+    )
+
+
+@contextmanager
+def bench_database(keepdb=False):
+    """ Тестовая база и окружение замера BENCH_SETTINGS. """
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, keepdb=keepdb
+    )
+    try:
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media, **BENCH_SETTINGS
+        ):
+            yield
+    finally:
+        connection.creation.destroy_test_db(
+            old_name, verbosity=0, keepdb=keepdb
+        )
+
+
+def seed_dataset(options):
+    """
+    Синтетические данные на реальных тегах и ингредиентах, размеры
+    из add_dataset_arguments. Возвращает пользователей.
+    """
+    rng = random.Random(options["seed"])
+    data_dir = Path(options["data_dir"])
+    for name in ('ingredients.json', 'tags.json'):
+        call_command(
+            'loader', path=str(data_dir / name), stdout=io.StringIO()
+        )
+    ingredients = list(Ingredient.objects.values_list('id', flat=True))
+    tags = list(Tag.objects.values_list('id', flat=True))
+    if not ingredients or not tags:
+        raise CommandError('Нет тегов или ингредиентов для замера')
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), 'orange').save(buffer, 'PNG')
+    default_storage.save(IMAGE, ContentFile(buffer.getvalue()))
+
+    password = make_password(PASSWORD)
+    users = User.objects.bulk_create([
+        User(
+            username=f'bench{number}', email=f'bench{number}@example.com',
+            first_name='Bench', last_name=str(number), password=password
+        )
+        for number in range(options["users"] + 1)
+    ])
+    Token.objects.bulk_create([
+        Token(user=user, key=Token.generate_key()) for user in users
+    ])
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            author=user, name=f'Рецепт {user.id}-{number}',
+            image=IMAGE, text='Описание ' * 20,
+            cooking_time=rng.randint(1, 120)
+        )
+        for user in users for number in range(
+            options["recipes_per_user"]
+        )
+    ])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
+            recipe=recipe, ingredient_id=ingredient,
+            amount=rng.randint(1, 500)
+        )
+        for recipe in recipes for ingredient in rng.sample(
+            ingredients,
+            min(options["ingredients_per_recipe"], len(ingredients))
+        )
+    ])
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe=recipe, tag_id=tag)
+        for recipe in recipes
+        for tag in rng.sample(
+            tags, rng.randint(1, min(2, len(tags)))
+        )
+    ])
+    for model, count in (
+        (Favorite, options["favorites_per_user"]),
+        (ShoppingList, options["carts_per_user"]),
+    ):
+        model.objects.bulk_create([
+            model(user=user, recipe=recipe)
+            for user in users
+            for recipe in rng.sample(
+                recipes, min(count, len(recipes))
+            )
+        ])
+    Subscription.objects.bulk_create([
+        Subscription(user=user, author=author)
+        for user in users
+        for author in rng.sample(
+            [other for other in users if other != user],
+            min(options["subscriptions_per_user"], len(users) - 1)
+        )
+    ])
+    call_command('recount', stdout=io.StringIO())
+    call_command('update_scores', full=True, stdout=io.StringIO())
+    call_command('rebuild_documents', stdout=io.StringIO())
+    return users
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер задержки, числа запросов к базе и размера ответа '
+        'для маршрутов API на синтетических данных'
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="measured requests per endpoint"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=2,
+            help="unmeasured requests per endpoint"
+        )
+        parser.add_argument(
+            "--output", type=str, help="write results to this JSON file"
+        )
+        parser.add_argument(
+            "--baseline", type=str,
+            help="fail if query counts exceed this JSON baseline"
+        )
+        parser.add_argument(
+            "--latency-tolerance", type=float,
+            help="also fail if p95 exceeds the baseline times this factor"
+        )
+        parser.add_argument(
+            "--keepdb", action="store_true",
+            help="keep the test database between runs"
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        with bench_database(options["keepdb"]):
+            self.seed()
+            results = self.run(self.endpoints())
+
+        report = {
+            'meta': {
+                'vendor': connection.vendor,
+                'repeat': options["repeat"],
+                'dataset': {
+                    name: options[name] for name in (
+                        'users', 'recipes_per_user', 'favorites_per_user',
+                        'carts_per_user', 'subscriptions_per_user',
+                        'ingredients_per_recipe', 'seed',
+                    )
+                },
+                'not_covered': sorted(self.not_covered),
+            },
+            'endpoints': results,
+        }
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(content + '\n')
+        self.print_table(results)
+        if options["baseline"]:
+            self.compare(results, json.loads(
+                Path(options["baseline"]).read_text()
+            )['endpoints'])
+
+    def seed(self):
+        users = seed_dataset(self.options)
+
+        # Последний пользователь не участвует в подписках и избранном,
+        # от его имени проверяются добавление и удаление.
+        self.user = users[0]
+        self.actor = users[-1]
+        Favorite.objects.filter(user=self.actor).delete()
+        ShoppingList.objects.filter(user=self.actor).delete()
+        Subscription.objects.filter(user=self.actor).delete()
+
+    def endpoints(self):
+        user = self.user
+        actor = self.actor
+        recipe = Recipe.objects.exclude(author=actor).order_by('id').first()
+        own = Recipe.objects.filter(author=actor).order_by('id').first()
+        author = User.objects.exclude(pk=actor.pk).order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        recipe_data = {
+            'ingredients': [{'id': ingredient.id, 'amount': 10}],
+            'tags': [tag.id],
+            'image': image_data(),
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        counter = iter(range(10 ** 9))
+
+        def relation(model, **fields):
+            def add():
+                model.objects.get_or_create(**fields)
+
+            def remove():
+                model.objects.filter(**fields).delete()
+            return add, remove
+
+        def relations(model, field, objects):
+            def add():
+                model.objects.bulk_create(
+                    [model(user=actor, **{field: obj}) for obj in objects],
+                    ignore_conflicts=True
+                )
+
+            def remove():
+                model.objects.filter(
+                    user=actor, **{f'{field}__in': objects}
+                ).delete()
+            return add, remove
+
+        def new_recipe():
+            self.deleted = Recipe.objects.create(
+                author=actor, name='Удаляемый', image=IMAGE,
+                text='Описание', cooking_time=5
+            )
+
+        def new_user_data():
+            number = next(counter)
+            return {
+                'email': f'new{number}@example.com',
+                'username': f'new{number}', 'first_name': 'New',
+                'last_name': 'User', 'password': 'Bench-passw0rd',
+            }
+
+        add_favorite, remove_favorite = relation(
+            Favorite, user=actor, recipe=recipe
+        )
+        add_cart, remove_cart = relation(
+            ShoppingList, user=actor, recipe=recipe
+        )
+        add_subscription, remove_subscription = relation(
+            Subscription, user=actor, author=author
+        )
+        recipes = list(
+            Recipe.objects.exclude(author=actor).order_by('id')[:BULK_SIZE]
+        )
+        authors = list(
+            User.objects.exclude(pk=actor.pk).order_by('id')[:BULK_SIZE]
+        )
+        recipe_ids = {'ids': [obj.id for obj in recipes]}
+        author_ids = {'ids': [obj.id for obj in authors]}
+        add_favorites, remove_favorites = relations(
+            Favorite, 'recipe', recipes
+        )
+        add_carts, remove_carts = relations(ShoppingList, 'recipe', recipes)
+        add_subscriptions, remove_subscriptions = relations(
+            Subscription, 'author', authors
+        )
+        return [
+            Endpoint('recipes list (anonymous)', 'get', '/api/recipes/'),
+            Endpoint('recipes list', 'get', '/api/recipes/', user),
+            Endpoint('recipes list, cursor', 'get',
+                     '/api/recipes/?cursor=', user),
+            Endpoint('recipes list, is_favorited', 'get',
+                     '/api/recipes/?is_favorited=1', user),
+            Endpoint('recipes list, is_in_shopping_cart', 'get',
+                     '/api/recipes/?is_in_shopping_cart=1', user),
+            Endpoint('recipes list, tags', 'get',
+                     f'/api/recipes/?tags={tag.slug}', user),
+            Endpoint('recipes list, author', 'get',
+                     f'/api/recipes/?author={author.id}', user),
+            Endpoint('recipes list, popularity', 'get',
+                     '/api/recipes/?ordering=-popularity', user),
+            Endpoint('recipe detail', 'get',
+                     f'/api/recipes/{recipe.id}/', user),
+            Endpoint('recipe create', 'post', '/api/recipes/', actor,
+                     recipe_data, status=201),
+            Endpoint('recipe update', 'patch', f'/api/recipes/{own.id}/',
+                     actor, recipe_data),
+            Endpoint('recipe delete', 'delete', lambda: (
+                f'/api/recipes/{self.deleted.id}/'
+            ), actor, setup=new_recipe, status=204),
+            Endpoint('favorite add', 'post',
+                     f'/api/recipes/{recipe.id}/favorite/', actor,
+                     setup=remove_favorite, status=201),
+            Endpoint('favorite remove', 'delete',
+                     f'/api/recipes/{recipe.id}/favorite/', actor,
+                     setup=add_favorite, status=204),
+            Endpoint('favorites bulk add', 'post', '/api/recipes/favorite/',
+                     actor, recipe_ids, setup=remove_favorites),
+            Endpoint('favorites bulk remove', 'delete',
+                     '/api/recipes/favorite/', actor, recipe_ids,
+                     setup=add_favorites),
+            Endpoint('shopping cart add', 'post',
+                     f'/api/recipes/{recipe.id}/shopping_cart/', actor,
+                     setup=remove_cart, status=201),
+            Endpoint('shopping cart remove', 'delete',
+                     f'/api/recipes/{recipe.id}/shopping_cart/', actor,
+                     setup=add_cart, status=204),
+            Endpoint('shopping cart bulk add', 'post',
+                     '/api/recipes/shopping_cart/', actor, recipe_ids,
+                     setup=remove_carts),
+            Endpoint('shopping cart bulk remove', 'delete',
+                     '/api/recipes/shopping_cart/', actor, recipe_ids,
+                     setup=add_carts),
+            Endpoint('shopping cart totals', 'get',
+                     '/api/recipes/shopping_cart/', user),
+            Endpoint('shopping list pdf', 'get',
+                     '/api/recipes/download_shopping_cart/', user),
+            Endpoint('shopping list txt', 'get',
+                     '/api/recipes/download_shopping_cart/?format=txt',
+                     user),
+            Endpoint('shopping list csv', 'get',
+                     '/api/recipes/download_shopping_cart/?format=csv',
+                     user),
+            Endpoint('ingredients list', 'get', '/api/ingredients/'),
+            Endpoint('ingredients search', 'get',
+                     f'/api/ingredients/?name={ingredient.name[:2]}'),
+            Endpoint('ingredient detail', 'get',
+                     f'/api/ingredients/{ingredient.id}/'),
+            Endpoint('tags list', 'get', '/api/tags/'),
+            Endpoint('tag detail', 'get', f'/api/tags/{tag.id}/'),
+            Endpoint('api root', 'get', '/api/'),
+            Endpoint('users list', 'get', '/api/users/', user),
+            Endpoint('user detail', 'get', f'/api/users/{author.id}/', user),
+            Endpoint('user me', 'get', '/api/users/me/', user),
+            Endpoint('user create', 'post', '/api/users/',
+                     data=new_user_data, status=201),
+            Endpoint('set password', 'post', '/api/users/set_password/',
+                     actor, {'current_password': PASSWORD,
+                             'new_password': PASSWORD},
+                     status=204),
+            Endpoint('subscriptions', 'get',
+                     '/api/users/subscriptions/?recipes_limit=3', user),
+            Endpoint('subscribe', 'post',
+                     f'/api/users/{author.id}/subscribe/', actor,
+                     setup=remove_subscription, status=201),
+            Endpoint('unsubscribe', 'delete',
+                     f'/api/users/{author.id}/subscribe/', actor,
+                     setup=add_subscription, status=204),
+            Endpoint('subscribe bulk', 'post', '/api/users/subscribe/',
+                     actor, author_ids, setup=remove_subscriptions),
+            Endpoint('unsubscribe bulk', 'delete', '/api/users/subscribe/',
+                     actor, author_ids, setup=add_subscriptions),
+            Endpoint('token login', 'post', '/api/auth/token/login/',
+                     data={'email': actor.email, 'password': PASSWORD}),
+            Endpoint('token logout', 'post', '/api/auth/token/logout/',
+                     actor, status=204),
+        ]
+
+    def request(self, client, endpoint):
+        path = endpoint.path() if callable(endpoint.path) else endpoint.path
+        data = endpoint.data() if callable(endpoint.data) else endpoint.data
+        if endpoint.user is not None:
+            # logout удаляет токен, поэтому он создаётся заново.
+            token, _ = Token.objects.get_or_create(user=endpoint.user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        else:
+            client.credentials()
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            response = getattr(client, endpoint.method)(
+                path, data, format='json'
+            )
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+            else:
+                content = response.content
+            elapsed = perf_counter() - start
+        if response.status_code != endpoint.status:
+            raise CommandError(
+                f'{endpoint.name}: {response.status_code} '
+                f'{content[:200]!r}'
+            )
+        self.covered.add(resolve(path.split('?')[0]).route)
+        return elapsed, len(queries), len(content)
+
+    def run(self, endpoints):
+        client = APIClient()
+        self.covered = set()
+        results = {}
+        for endpoint in endpoints:
+            timings = []
+            counts = []
+            size = 0
+            for number in range(
+                self.options["warmup"] + self.options["repeat"]
+            ):
+                if endpoint.setup is not None:
+                    endpoint.setup()
+                elapsed, count, size = self.request(client, endpoint)
+                if number == 0:
+                    cold = count
+                if number >= self.options["warmup"]:
+                    timings.append(elapsed * 1000)
+                    counts.append(count)
+            results[endpoint.name] = {
+                'method': endpoint.method.upper(),
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'queries': max(counts),
+                'queries_cold': cold,
+                'bytes': size,
+            }
+        self.not_covered = set(url_patterns()) - self.covered
+        return results
+
+    def print_table(self, results):
+        self.stdout.write(
+            f'{"endpoint":<36}{"p50 ms":>10}{"p95 ms":>10}'
+            f'{"queries":>9}{"cold":>6}{"bytes":>10}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<36}{result["p50_ms"]:>10.2f}'
+                f'{result["p95_ms"]:>10.2f}{result["queries"]:>9}'
+                f'{result["queries_cold"]:>6}{result["bytes"]:>10}'
+            )
+        if self.not_covered:
+            self.stdout.write(
+                'Не замерены: ' + ', '.join(sorted(self.not_covered))
+            )
+
+    def compare(self, results, baseline):
+        tolerance = self.options["latency_tolerance"]
+        problems = []
+        for name, expected in baseline.items():
+            result = results.get(name)
+            if result is None:
+                problems.append(f'{name}: нет в результатах')
+                continue
+            for field in ('queries', 'queries_cold'):
+                if result[field] > expected[field]:
+                    problems.append(
+                        f'{name}: {field} {expected[field]} -> '
+                        f'{result[field]}'
+                    )
+            if tolerance and (
+                result['p95_ms'] > expected['p95_ms'] * tolerance
+            ):
+                problems.append(
+                    f'{name}: p95 {expected["p95_ms"]} -> '
+                    f'{result["p95_ms"]} мс'
+                )
+        if problems:
+            raise CommandError(
+                'Регрессии относительно базовой линии:\n'
+                + '\n'.join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Регрессий относительно базовой линии нет'
+        ))
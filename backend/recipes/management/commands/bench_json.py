@@ -0,0 +1,77 @@
+import json
+import tracemalloc
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from foodgram.renderers import FastJSONRenderer
+from .bench import percentile
+
+PATHS = ('/api/recipes/?limit=100', '/api/ingredients/')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение JSON-рендереров на ответах API из текущей базы: '
+        'время кодирования, пик памяти и совпадение с JSONRenderer DRF'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=PATHS, help='адреса API'
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=200,
+            help="renders per renderer and path"
+        )
+
+    def handle(self, *args, **options):
+        client = APIClient()
+        self.stdout.write(
+            f'{"path / renderer":<44}{"p50 ms":>10}{"p95 ms":>10}'
+            f'{"peak KiB":>10}{"bytes":>10}  same'
+        )
+        for path in options["paths"]:
+            response = client.get(path, HTTP_ACCEPT='application/json')
+            if response.status_code != 200:
+                raise CommandError(f'{path}: {response.status_code}')
+            data = json.loads(response.content)
+            self.stdout.write(path)
+            expected = JSONRenderer().render(data)
+            for name, render in self.renderers():
+                timings, peak, content = self.measure(
+                    render, data, options["repeat"]
+                )
+                self.stdout.write(
+                    f'  {name:<42}{percentile(timings, 50):>10.3f}'
+                    f'{percentile(timings, 95):>10.3f}'
+                    f'{peak / 1024:>10.1f}{len(content):>10}'
+                    f'  {"да" if content == expected else "нет"}'
+                )
+
+    def renderers(self):
+        yield 'JSONRenderer (DRF)', JSONRenderer().render
+        fast = FastJSONRenderer()
+        if fast.use_orjson:
+            yield 'FastJSONRenderer (orjson)', fast.render
+        fallback = FastJSONRenderer()
+        fallback.use_orjson = False
+        yield 'FastJSONRenderer (json)', fallback.render
+
+    @staticmethod
+    def measure(render, data, repeat):
+        render(data)
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            render(data)
+            timings.append((perf_counter() - start) * 1000)
+        tracemalloc.start()
+        try:
+            content = render(data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return timings, peak, content
@@ -0,0 +1,133 @@
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Value
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from recipes import projections
+from recipes.models import Recipe
+from recipes.serializers import RecipeSerializer
+from users.models import Subscription, User
+from users.serializers import CustomUserSerializer, SubscribeSerializer
+from .bench import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение проекций recipes.projections с сериализаторами DRF '
+        'на данных текущей базы: совпадение json и время на объект'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=20,
+            help="measured runs per case"
+        )
+
+    def handle(self, *args, **options):
+        viewer = User.objects.annotate(
+            subscriptions=Count('subscriber')
+        ).order_by('-subscriptions', 'id').first()
+        if viewer is None or not Recipe.objects.exists():
+            raise CommandError('Нужны пользователи и рецепты в базе')
+        request = Request(RequestFactory().get('/api/'))
+        request.user = viewer
+        self.stdout.write(
+            f'{"case":<16}{"objects":>8}{"DRF us":>10}{"fast us":>10}'
+            f'{"speed-up":>10}  same'
+        )
+        failed = []
+        for name, serializer, projection in self.cases(viewer, request):
+            expected, slow = self.measure(serializer, options["repeat"])
+            actual, fast = self.measure(projection, options["repeat"])
+            same = [
+                JSONRenderer().render(item) for item in expected
+            ] == [JSONRenderer().render(item) for item in actual]
+            if not same:
+                failed.append(name)
+            count = max(len(expected), 1)
+            self.stdout.write(
+                f'{name:<16}{len(expected):>8}'
+                f'{slow / count * 1e6:>10.1f}{fast / count * 1e6:>10.1f}'
+                f'{slow / fast if fast else 0:>9.1f}x'
+                f'  {"да" if same else "нет"}'
+            )
+        if failed:
+            raise CommandError(
+                'Проекции отличаются от сериализаторов: ' + ', '.join(failed)
+            )
+
+    def cases(self, viewer, request):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+
+        def recipes_drf():
+            return sorted(RecipeSerializer(
+                Recipe.objects.filter(
+                    id__in=recipe_ids
+                ).with_user_flags(AnonymousUser()),
+                many=True
+            ).data, key=lambda recipe: recipe['id'])
+
+        def recipes_fast():
+            documents = projections.recipe_documents(recipe_ids)
+            return [documents[pk] for pk in sorted(documents)]
+
+        def users_drf():
+            return CustomUserSerializer(
+                User.objects.order_by('id').annotate(
+                    is_subscribed=Exists(Subscription.objects.filter(
+                        user=viewer, author=OuterRef('pk')
+                    ))
+                ),
+                many=True
+            ).data
+
+        def users_fast():
+            return projections.users(
+                User.objects.order_by('id').values(*projections.USER.values),
+                set(viewer.subscriber.values_list('author_id', flat=True))
+            )
+
+        authors = User.objects.filter(author__user=viewer).annotate(
+            subscription_id=F('author__id')
+        ).order_by('-subscription_id')
+
+        def subscriptions_drf():
+            return SubscribeSerializer(
+                authors.annotate(is_subscribed=Value(True)).prefetch_related(
+                    Prefetch(
+                        'recipes', to_attr='recent_recipes',
+                        queryset=Recipe.objects.latest_per_author(3)
+                    )
+                ),
+                many=True, context={'request': request}
+            ).data
+
+        def subscriptions_fast():
+            return projections.subscriptions(
+                authors.values(
+                    *projections.USER.values, 'recipes_count',
+                    'subscription_id'
+                ),
+                Recipe.objects.latest_per_author(3), request
+            )
+
+        return (
+            ('recipes', recipes_drf, recipes_fast),
+            ('users', users_drf, users_fast),
+            ('subscriptions', subscriptions_drf, subscriptions_fast),
+        )
+
+    @staticmethod
+    def measure(build, repeat):
+        """ Результат и медианное время построения (с запросами к базе). """
+        result = build()
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            build()
+            timings.append(perf_counter() - start)
+        return result, percentile(timings, 50)
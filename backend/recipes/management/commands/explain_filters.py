@@ -0,0 +1,140 @@
+import re
+from itertools import combinations
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from recipes.models import Recipe, Tag
+from recipes.views import RecipeViewSet
+from users.models import User
+from .bench import add_dataset_arguments, bench_database, seed_dataset
+
+ORDERINGS = (None, '-popularity', '-trending')
+
+# Индекс RecipeScore, с которого должна начинаться сортировка по оценке
+# без фильтров.
+SCORE_INDEXES = {
+    '-popularity': 'recipe_score_popularity_idx',
+    '-trending': 'recipe_score_trending_idx',
+}
+
+# Полный просмотр таблицы в выводе EXPLAIN PostgreSQL и SQLite.
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)(?:\s|$)'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN для всех сочетаний фильтров списка рецептов; '
+        'завершается ошибкой при полном просмотре больших таблиц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows", type=int, default=1000,
+            help="ignore sequential scans over smaller tables"
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true",
+            help="print every plan"
+        )
+        parser.add_argument(
+            "--synthetic", action="store_true",
+            help="check plans on a temporary database seeded like bench"
+        )
+        add_dataset_arguments(
+            parser, users=300, recipes_per_user=10, favorites_per_user=10
+        )
+
+    def handle(self, *args, **options):
+        if not options["synthetic"]:
+            return self.check_plans(options)
+        with bench_database():
+            seed_dataset(options)
+            with connection.cursor() as cursor:
+                # Статистика для планировщика, как после autovacuum.
+                cursor.execute('ANALYZE')
+            self.check_plans(options)
+
+    def check_plans(self, options):
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'EXPLAIN для {connection.vendor} не разобран')
+        user = User.objects.annotate(
+            favorites_total=Count('favorites')
+        ).order_by('-favorites_total').first()
+        tag = Tag.objects.first()
+        if user is None or tag is None:
+            raise CommandError('Нужны пользователи и теги в базе')
+        params = {
+            'tags': tag.slug,
+            'author': str(user.recipes.values_list('author', flat=True)
+                          .first() or user.id),
+            'is_favorited': '1',
+            'is_in_shopping_cart': '1',
+        }
+        large = self.large_tables(options["min_rows"])
+
+        problems = []
+        checked = 0
+        for size in range(len(params) + 1):
+            for names in combinations(params, size):
+                for ordering in ORDERINGS:
+                    query = {name: params[name] for name in names}
+                    if ordering:
+                        query['ordering'] = ordering
+                    plan = self.explain(user, query)
+                    checked += 1
+                    if options["verbose_plans"]:
+                        self.stdout.write(f'{query}\n{plan}\n')
+                    problems += [
+                        f'{query}: {problem}' for problem
+                        in self.plan_problems(plan, query, pattern, large)
+                    ]
+        if problems:
+            raise CommandError(
+                'Полный просмотр таблиц или сортировка без индекса:\n'
+                + '\n'.join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено планов: {checked}, полных просмотров больших '
+            f'таблиц нет ({", ".join(sorted(large)) or "-"})'
+        ))
+
+    @staticmethod
+    def plan_problems(plan, query, pattern, large):
+        """
+        Полные просмотры больших таблиц; для сортировки по оценке без
+        фильтров - ещё и план, не начинающийся с индекса RecipeScore.
+        """
+        problems = sorted(set(pattern.findall(plan)) & large)
+        index = SCORE_INDEXES.get(query.get('ordering'))
+        if index and len(query) == 1 and index not in plan:
+            problems.append(f'без индекса {index}')
+        return problems
+
+    def large_tables(self, min_rows):
+        tables = set()
+        for model in (Recipe, Recipe.tags.through, Recipe.favorites.rel
+                      .related_model, Recipe.shopping.rel.related_model):
+            if model.objects.count() >= min_rows:
+                tables.add(model._meta.db_table)
+        return tables
+
+    def explain(self, user, query):
+        """ План запроса, который выполняет список рецептов. """
+        request = Request(RequestFactory().get('/api/recipes/', query))
+        request.user = user
+        view = RecipeViewSet(
+            request=request, action='list', format_kwarg=None, kwargs={}
+        )
+        queryset = view.filter_queryset(
+            Recipe.objects.annotate_user_flags(user)
+        ).values('id', 'created')
+        return queryset[:settings.PAGE_SIZE].explain()
@@ -0,0 +1,187 @@
+import asyncio
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench import percentile
+
+
+class Result:
+    """ Итоги прогона одного адреса. """
+
+    def __init__(self, url):
+        self.url = url
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.elapsed = 0
+
+    @property
+    def throughput(self):
+        return len(self.latencies) / self.elapsed if self.elapsed else 0
+
+
+async def read_response(reader):
+    """ Статус и тело ответа HTTP/1.1 (Content-Length или chunked). """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Соединение закрыто сервером')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = b''
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                break
+            body += chunk[:-2]
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    return status, body, keep_alive
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: запросы к запущенному серверу с заданным числом '
+        'одновременных клиентов. Несколько адресов (например, WSGI и ASGI '
+        'развёртывания) проверяются по очереди и сравниваются с первым.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='адреса для проверки')
+        parser.add_argument(
+            '--concurrency', type=int, default=200,
+            help='одновременных клиентов'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=5000,
+            help='запросов на адрес'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=200,
+            help='запросов до замера (прогрев кэша и соединений)'
+        )
+        parser.add_argument(
+            '--header', action='append', default=[],
+            help='заголовок запроса, например "Authorization: Token ..."'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=30, help='таймаут запроса, с'
+        )
+
+    def handle(self, *args, **options):
+        self.concurrency = options['concurrency']
+        self.timeout = options['timeout']
+        self.headers = []
+        for header in options['header']:
+            name, separator, value = header.partition(':')
+            if not separator:
+                raise CommandError(f'Некорректный заголовок: {header}')
+            self.headers.append((name.strip(), value.strip()))
+
+        results = []
+        for url in options['urls']:
+            parts = urlsplit(url)
+            if parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f'Поддерживаются только http-адреса: {url}')
+            if options['warmup']:
+                asyncio.run(self.run(url, options['warmup']))
+            result = asyncio.run(self.run(url, options['requests']))
+            results.append(result)
+            self.report(result, results[0])
+
+    async def run(self, url, total):
+        result = Result(url)
+        remaining = [total]
+        start = perf_counter()
+        await asyncio.gather(*(
+            self.client(url, remaining, result)
+            for _ in range(min(self.concurrency, total))
+        ))
+        result.elapsed = perf_counter() - start
+        return result
+
+    def build_request(self, parts):
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        lines = [
+            f'GET {path} HTTP/1.1',
+            f'Host: {parts.netloc}',
+            'Accept: application/json',
+            'Connection: keep-alive',
+        ] + [f'{name}: {value}' for name, value in self.headers]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def client(self, url, remaining, result):
+        """ Клиент с постоянным соединением, переподключается после ошибок. """
+        parts = urlsplit(url)
+        request = self.build_request(parts)
+        writer = None
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(
+                            parts.hostname, parts.port or 80
+                        ),
+                        self.timeout
+                    )
+                writer.write(request)
+                status, _, keep_alive = await asyncio.wait_for(
+                    read_response(reader), self.timeout
+                )
+            except (OSError, ValueError, IndexError,
+                    asyncio.TimeoutError, asyncio.IncompleteReadError):
+                result.errors += 1
+                writer = await self.close(writer)
+                continue
+            result.latencies.append(perf_counter() - start)
+            result.statuses[status] = result.statuses.get(status, 0) + 1
+            if not keep_alive:
+                writer = await self.close(writer)
+        await self.close(writer)
+
+    @staticmethod
+    async def close(writer):
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def report(self, result, baseline):
+        latencies = result.latencies or [0]
+        statuses = ', '.join(
+            f'{status}: {count}'
+            for status, count in sorted(result.statuses.items())
+        )
+        line = (
+            f'{result.url}\n'
+            f'  {result.throughput:.1f} запросов/с, '
+            f'p50 {percentile(latencies, 50) * 1000:.1f} мс, '
+            f'p95 {percentile(latencies, 95) * 1000:.1f} мс, '
+            f'p99 {percentile(latencies, 99) * 1000:.1f} мс; '
+            f'ответы {statuses or "-"}, ошибки соединения {result.errors}'
+        )
+        if result is not baseline and baseline.throughput:
+            line += (
+                f'\n  пропускная способность '
+                f'{result.throughput / baseline.throughput:.2f}x '
+                f'от {baseline.url}'
+            )
+        self.stdout.write(line)
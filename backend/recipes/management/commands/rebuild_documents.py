@@ -0,0 +1,36 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.documents import build_documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересборка документов рецептов (RecipeDocument)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing", action="store_true",
+            help="build only recipes without a document"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="recipes per query"
+        )
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        recipes = Recipe.objects.order_by('id')
+        if options["missing"]:
+            recipes = recipes.filter(document__isnull=True)
+        recipe_ids = list(recipes.values_list('id', flat=True))
+        batch_size = options["batch_size"]
+        built = 0
+        for offset in range(0, len(recipe_ids), batch_size):
+            built += len(build_documents(
+                recipe_ids[offset:offset + batch_size], batch_size
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Собрано документов: {built} за {perf_counter() - start:.3f} с'
+        ))
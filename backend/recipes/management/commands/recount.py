@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from recipes.counters import actual_count
+from recipes.models import Recipe
+from users.models import User
+
+# Модель, поле счётчика и связь, по которой он считается.
+COUNTERS = (
+    (Recipe, 'favorites_count', 'favorites'),
+    (Recipe, 'in_carts_count', 'shopping'),
+    (User, 'recipes_count', 'recipes'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного, списков покупок и рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="rows per update"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="report drift without fixing it"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        for model, field, relation in COUNTERS:
+            actual = actual_count(model, relation)
+            drift = list(
+                model.objects.annotate(actual=actual)
+                .exclude(**{field: F('actual')})
+                .values_list('pk', flat=True)
+            )
+            if not options["dry_run"]:
+                with transaction.atomic():
+                    for start in range(0, len(drift), batch_size):
+                        model.objects.filter(
+                            pk__in=drift[start:start + batch_size]
+                        ).update(**{field: actual})
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}.{field}: '
+                f'расхождений {len(drift)}'
+                + (' [dry-run]' if options["dry_run"] else '')
+            ))
@@ -0,0 +1,37 @@
+from time import perf_counter, sleep
+
+from django.core.management.base import BaseCommand
+
+from recipes.scores import update_scores
+
+
+class Command(BaseCommand):
+    help = 'Инкрементальный пересчёт популярности и трендов рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="recompute popularity for every recipe"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="recipes per update"
+        )
+        parser.add_argument(
+            "--interval", type=int, default=0,
+            help="repeat every N seconds instead of running once"
+        )
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        while True:
+            start = perf_counter()
+            updated = update_scores(full, options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f'Обновлено оценок: {updated} '
+                f'за {perf_counter() - start:.3f} с'
+            ))
+            if not options["interval"]:
+                return
+            full = False
+            sleep(options["interval"])
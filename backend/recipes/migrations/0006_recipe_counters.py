@@ -0,0 +1,47 @@
+# Generated by Django 4.2.5 on 2026-10-18 17:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    User = apps.get_model('users', 'User')
+    for model, field, related, name in (
+        (Recipe, 'favorites_count', apps.get_model('recipes', 'Favorite'),
+         'recipe'),
+        (Recipe, 'in_carts_count', apps.get_model('recipes', 'ShoppingList'),
+         'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+    ):
+        model.objects.update(**{field: Coalesce(
+            Subquery(
+                related.objects.filter(**{name: OuterRef('pk')})
+                .order_by().values(name)
+                .annotate(count=Count('pk')).values('count')
+            ),
+            0
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_variants'),
+        ('users', '0002_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.5 on 2026-10-18 17:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_scores(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    RecipeScore.objects.bulk_create(
+        [
+            RecipeScore(
+                recipe_id=recipe_id,
+                popularity=(
+                    favorites * settings.SCORE_FAVORITE_WEIGHT
+                    + carts * settings.SCORE_SHOPPING_WEIGHT
+                )
+            )
+            for recipe_id, favorites, carts in Recipe.objects.values_list(
+                'id', 'favorites_count', 'in_carts_count'
+            ).iterator()
+        ],
+        batch_size=1000
+    )
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_favorite_id', models.PositiveIntegerField(default=0)),
+                ('last_shopping_id', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Отметка расчёта оценок',
+                'verbose_name_plural': 'Отметки расчёта оценок',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('popularity', models.FloatField(default=0, verbose_name='Популярность')),
+                ('trending', models.FloatField(default=0, verbose_name='Тренд')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Оценка рецепта',
+                'verbose_name_plural': 'Оценки рецептов',
+                'indexes': [models.Index(fields=['-popularity', '-recipe'], name='recipe_score_popularity_idx'), models.Index(fields=['-trending', '-recipe'], name='recipe_score_trending_idx')],
+            },
+        ),
+        migrations.RunPython(create_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.5 on 2026-10-18 18:24
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+        'ON recipes_recipe USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        "UPDATE recipes_recipe SET search_vector = "
+        "setweight(to_tsvector('russian', COALESCE(name, '')), 'A') || "
+        "setweight(to_tsvector('russian', COALESCE(("
+        "SELECT string_agg(ingredient.name, ' ') "
+        "FROM recipes_recipeingredient AS item "
+        "JOIN recipes_ingredient AS ingredient "
+        "ON ingredient.id = item.ingredient_id "
+        "WHERE item.recipe_id = recipes_recipe.id"
+        "), '')), 'B') || "
+        "setweight(to_tsvector('russian', COALESCE(text, '')), 'C')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,21 +1,58 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.response import Response
 
+from foodgram.db.routers import read_from_primary
+from monitoring.metrics import record_cache
+from .cache import (get_catalog_version, get_recipe_versions, get_user_flags,
+                    invalidate_user_flags, make_key)
+from .documents import apply_user_flags, get_documents
 from .models import Recipe
+from .projections import absolute_urls
+from .serializers import BulkIdsSerializer
+from .signals import bulk_created, bulk_deleted, without_row_signals
+
+
+def lock_user(user):
+    """
+    Блокирует строку пользователя до конца транзакции: изменения его
+    связей (избранное, корзина, подписки) выполняются по очереди.
+    """
+    list(type(user).objects.select_for_update().filter(
+        pk=user.pk
+    ).values_list('pk'))
 
 
 class AddDelMixin:
-    def add_del_recipe(request, pk, serializer, model):
+    def add_del_recipe(self, request, pk, serializer, model):
         recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
+        with transaction.atomic():
+            lock_user(request.user)
+            response = self.change_relation(
+                request, recipe, serializer, model
+            )
+        if status.is_success(response.status_code):
+            invalidate_user_flags(request.user)
+        return response
 
+    def change_relation(self, request, recipe, serializer, model):
+        user = request.user
         if request.method == 'POST':
             serializer = serializer(
-                recipe, data=request.data, context={'request': request}
+                data={'user': user.id, 'recipe': recipe.id},
+                context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer().save()
+            serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
@@ -27,3 +64,213 @@ class AddDelMixin:
             obj.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    def bulk_add_del(self, request, model, field, queryset, exclude=()):
+        """
+        Пакетное добавление (POST) или удаление (DELETE) связей
+        пользователя model(user, field) с объектами queryset по списку
+        {"ids": [...]} в одной транзакции.
+
+        Строка пользователя блокируется (lock_user), поэтому набор уже
+        существующих связей не меняется до конца транзакции. Объекты
+        проверяются одним in_bulk, новые строки вставляются bulk_create
+        с сигналом bulk_created, удаление - QuerySet.delete с сигналом
+        bulk_deleted вместо сигналов по строкам. Ответ - статус каждого
+        id: added, exists, removed, absent, not_found или forbidden
+        (exclude).
+        """
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        with transaction.atomic():
+            lock_user(user)
+            found = set(queryset.in_bulk(ids)) - set(exclude)
+            relations = model.objects.filter(
+                user=user, **{f'{field}_id__in': found}
+            )
+            existing = set(
+                relations.values_list(f'{field}_id', flat=True)
+            )
+            if request.method == 'POST':
+                changed = [
+                    pk for pk in ids if pk in found and pk not in existing
+                ]
+                model.objects.bulk_create([
+                    model(user=user, **{f'{field}_id': pk})
+                    for pk in changed
+                ])
+                if changed:
+                    bulk_created.send(model, user_id=user.id, ids=changed)
+                statuses = ('added', 'exists')
+            else:
+                changed = existing
+                if changed:
+                    with without_row_signals(model):
+                        relations.delete()
+                    bulk_deleted.send(model, user_id=user.id, ids=changed)
+                statuses = ('removed', 'absent')
+        if changed:
+            invalidate_user_flags(user)
+        changed = set(changed)
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'forbidden' if pk in exclude
+                    else 'not_found' if pk not in found
+                    else statuses[0] if pk in changed
+                    else statuses[1]
+                )
+            }
+            for pk in ids
+        ]})
+
+
+class CatalogCacheMixin:
+    """
+    Кэширование ответов справочников (теги, ингредиенты).
+
+    Готовый json хранится в кэше по версии справочников и параметрам
+    запроса, ответ отдаётся с ETag и Last-Modified, условные запросы
+    получают 304 без обращения к базе данных.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        version = get_catalog_version()
+        key = make_key(
+            'catalog', version, self.basename, self.action,
+            kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+            request.accepted_media_type, query=request.query_params
+        )
+        entry = cache.get(key)
+        record_cache('catalog', entry is not None, entry is None)
+        if entry is None:
+            with read_from_primary():
+                response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = request.accepted_renderer.render(
+                response.data, request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            entry = (content, f'"{md5(content).hexdigest()}"')
+            cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+        return catalog_response(
+            request, entry, version, request.accepted_media_type
+        )
+
+
+def catalog_response(request, entry, version, media_type):
+    """ Ответ справочника из кэша с ETag и Last-Modified или 304. """
+    content, etag = entry
+    last_modified = version // 1000
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = HttpResponse(content, content_type=media_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(
+        response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE
+    )
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+class RecipeCacheMixin:
+    """
+    Кэширование списка и страниц рецептов.
+
+    Общая для всех пользователей часть рецепта хранится в кэше по id
+    и версии рецепта, при промахе берётся из RecipeDocument. Флаги
+    избранного, корзины и подписок подставляются из кэшированных
+    множеств текущего пользователя. На прогретом кэше список стоит
+    двух запросов: подсчёта и выборки id страницы (или одного
+    при постраничном выводе по курсору без подсчёта), рецепт - ни одного.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(
+            Recipe.objects.annotate_user_flags(request.user)
+        ).values('id', 'created')
+        page = self.paginate_queryset(queryset)
+        ids = [row['id'] for row in (queryset if page is None else page)]
+        data = self.merge_user_flags(
+            self.get_recipe_fragments(ids), request.user
+        )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().retrieve(request, *args, **kwargs)
+        pk = str(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        data = self.merge_user_flags(
+            self.get_recipe_fragments([int(pk)]) if pk.isdigit() else [],
+            request.user
+        )
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+    def get_fragment_keys(self, ids):
+        """ Ключи кэша рецептов по версии справочников и рецепта. """
+        catalog_version = get_catalog_version()
+        versions = get_recipe_versions(ids)
+        base_url = self.request.build_absolute_uri('/')
+        return {
+            recipe_id: make_key(
+                'recipe', catalog_version, recipe_id, versions[recipe_id],
+                base_url
+            )
+            for recipe_id in ids
+        }
+
+    def document_fragments(self, documents, keys):
+        return {
+            keys[pk]: absolute_urls(document, self.request)
+            for pk, document in documents.items()
+        }
+
+    def get_recipe_fragments(self, ids):
+        keys = self.get_fragment_keys(ids)
+        fragments = cache.get_many(keys.values())
+        missing = missing_fragments(keys, fragments)
+        if missing:
+            documents = self.document_fragments(get_documents(missing), keys)
+            cache.set_many(documents, settings.RECIPE_CACHE_TIMEOUT)
+            fragments.update(documents)
+        return ordered_fragments(keys, fragments)
+
+    def merge_user_flags(self, fragments, user):
+        if user.is_anonymous:
+            return fragments
+        return apply_user_flags(fragments, get_user_flags(user))
+
+
+def missing_fragments(keys, fragments):
+    """ id рецептов, которых нет в кэше; учитывается в метриках. """
+    missing = [
+        recipe_id for recipe_id, key in keys.items() if key not in fragments
+    ]
+    record_cache('recipe', len(keys) - len(missing), len(missing))
+    return missing
+
+
+def ordered_fragments(keys, fragments):
+    return [fragments[key] for key in keys.values() if key in fragments]
@@ -1,11 +1,16 @@
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db.models import (CASCADE, CharField, DateTimeField, ForeignKey,
-                              ImageField, ManyToManyField, Model,
-                              PositiveSmallIntegerField, SlugField, TextField,
-                              UniqueConstraint)
-
-from users.models import User
+from django.db.models import (CASCADE, BooleanField, CharField, DateTimeField,
+                              Exists, F, FloatField, ForeignKey, ImageField,
+                              Index, JSONField, Manager, ManyToManyField,
+                              Model, OneToOneField, OuterRef,
+                              PositiveIntegerField, PositiveSmallIntegerField,
+                              Prefetch, QuerySet, SlugField, TextField,
+                              UniqueConstraint, Value, Window)
+from django.db.models.functions import RowNumber
+
+from users.models import Subscription, User
 from .validators import validate_hex
 
 
@@ -56,6 +61,65 @@ class Tag(Model):
         return self.name
 
 
+class RecipeQuerySet(QuerySet):
+    """ Запросы рецептов с данными для сериализации. """
+
+    def annotate_user_flags(self, user):
+        """ Флаги избранного и списка покупок текущего пользователя. """
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(is_favorited=false, is_in_shopping_cart=false)
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        )
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты флагами текущего пользователя и подгружает
+        связанные объекты, чтобы число запросов не зависело от размера
+        страницы.
+        """
+        if user.is_anonymous:
+            is_subscribed = Value(False, output_field=BooleanField())
+        else:
+            is_subscribed = Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        return self.annotate_user_flags(user).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(is_subscribed=is_subscribed)
+            ),
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def latest_per_author(self, limit):
+        """ Не больше limit последних рецептов каждого автора. """
+        return self.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=[F('created').desc(), F('id').desc()]
+            )
+        ).filter(row_number__lte=limit)
+
+
+class RecipeManager(Manager.from_queryset(RecipeQuerySet)):
+    """ Рецепты без поискового вектора: он нужен только в WHERE. """
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
 class Recipe(Model):
     """ Модель рецепта """
 
@@ -68,6 +132,9 @@ class Recipe(Model):
     name = CharField(settings.ENTER_INGREDIENT_NAME,
                      max_length=settings.MAX_LENGTH_RECIPE_NAME)
     image = ImageField(settings.ENTER_IMAGE, upload_to='recipes/images/')
+    image_variants = JSONField(
+        'Варианты изображения', default=dict, blank=True, editable=False
+    )
     text = TextField(settings.ENTER_DESCRIPTION)
     ingredients = ManyToManyField(
         Ingredient,
@@ -88,11 +155,26 @@ class Recipe(Model):
         ]
     )
     created = DateTimeField(settings.ENTER_TIME_CREATION, auto_now_add=True)
+    favorites_count = PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    in_carts_count = PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+    # Заполняется только на PostgreSQL (recipes.search).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeManager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-created']
+        indexes = [
+            Index(fields=['-created', '-id'], name='recipe_created_id_idx'),
+            Index(fields=['author', '-created', '-id'],
+                  name='recipe_author_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -149,6 +231,9 @@ class RecipeTag(Model):
                 name='recipe_tag_unique'
             )
         ]
+        indexes = [
+            Index(fields=['tag', 'recipe'], name='recipe_tag_tag_recipe_idx')
+        ]
 
     def __str__(self) -> str:
         return f'{self.recipe} {self.tag}'
@@ -212,3 +297,76 @@ class ShoppingList(Model):
 
     def __str__(self) -> str:
         return f'{self.user} -> {self.recipe}'
+
+
+class RecipeScore(Model):
+    """
+    Предрасчитанные оценки рецепта для сортировки.
+
+    popularity - взвешенная сумма добавлений в избранное и списки покупок,
+    trending - log2 от суммы весов событий, умноженных на 2 ** (t / T),
+    где t - время события от SCORE_EPOCH, T - период полураспада.
+    Порядок по trending совпадает с порядком по затухающей сумме в любой
+    момент времени, поэтому старые строки не нужно пересчитывать.
+    """
+
+    recipe = OneToOneField(
+        Recipe,
+        on_delete=CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='score'
+    )
+    popularity = FloatField('Популярность', default=0)
+    trending = FloatField('Тренд', default=0)
+    updated = DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Оценка рецепта'
+        verbose_name_plural = 'Оценки рецептов'
+        indexes = [
+            Index(fields=['-popularity', '-recipe'],
+                  name='recipe_score_popularity_idx'),
+            Index(fields=['-trending', '-recipe'],
+                  name='recipe_score_trending_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id}: {self.popularity:.1f} / {self.trending:.3f}'
+
+
+class ScoreCheckpoint(Model):
+    """ Последние учтённые при расчёте оценок записи. """
+
+    last_favorite_id = PositiveIntegerField(default=0)
+    last_shopping_id = PositiveIntegerField(default=0)
+    updated = DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Отметка расчёта оценок'
+        verbose_name_plural = 'Отметки расчёта оценок'
+
+
+class RecipeDocument(Model):
+    """
+    Готовый json рецепта без флагов пользователя (recipes.documents).
+
+    Ссылки на изображения хранятся без адреса сервера.
+    """
+
+    recipe = OneToOneField(
+        Recipe,
+        on_delete=CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='document'
+    )
+    data = JSONField('Документ')
+    updated = DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self) -> str:
+        return str(self.recipe_id)
@@ -1,7 +1,182 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу (cursor).
+
+    Позиция задаётся значениями полей сортировки последнего элемента,
+    поэтому запрос не использует OFFSET, а новые записи не сдвигают
+    уже полученные страницы. Последнее поле сортировки должно быть
+    уникальным.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size_query_param = 'limit'
+    page_size = settings.PAGE_SIZE
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param), queryset
+        )
+        self.count = None
+        if request.query_params.get(self.count_query_param) != 'false':
+            self.count = queryset.count()
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self.invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results and (has_more or reverse):
+            self.next_position = self.get_position(results[-1])
+        if results and position is not None and (has_more or not reverse):
+            self.previous_position = self.get_position(results[0])
+        return results
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_link(self.next_position, reverse=False),
+            'previous': self.get_link(self.previous_position, reverse=True),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def field_name(field):
+        return field.lstrip('-')
+
+    def get_position(self, item):
+        names = [self.field_name(field) for field in self.ordering]
+        if isinstance(item, dict):
+            values = [item[name] for name in names]
+        else:
+            values = [getattr(item, name) for name in names]
+        return [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in values
+        ]
+
+    def after(self, ordering, position):
+        """ Условие «строго после позиции» для составного ключа. """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = self.field_name(field)
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps([position, int(reverse)], separators=(',', ':'))
+        return urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, queryset):
+        """
+        Позиция и направление из курсора; значения позиции приводятся
+        к типам полей сортировки, ошибка в курсоре - 404.
+        """
+        if not cursor:
+            return None, False
+        try:
+            data = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            position, reverse = json.loads(data)
+        except (BinasciiError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            position = [
+                self.get_field(queryset, field).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(reverse)
+
+    def get_field(self, queryset, field):
+        """ Поле модели или аннотации запроса по полю сортировки. """
+        name = self.field_name(field)
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def get_link(self, position, reverse):
+        if position is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param,
+            self.encode_cursor(position, reverse)
+        )
 
 
 class SimplePagination(PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы.
+
+    Если представление задаёт keyset_ordering, а в запросе передан
+    параметр cursor (пустой для первой страницы), используется
+    KeysetPagination по этим полям.
+    """
+
     page_size_query_param = 'limit'
     page_size = settings.PAGE_SIZE
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'keyset_ordering', None)
+        if (ordering
+                and KeysetPagination.cursor_query_param in request.query_params
+                and tuple(queryset.query.order_by) == tuple(ordering)):
+            self.keyset = KeysetPagination(ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
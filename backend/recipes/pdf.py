@@ -0,0 +1,415 @@
+import zlib
+from functools import lru_cache
+from hashlib import md5
+from pathlib import Path
+from struct import pack, unpack_from
+
+from django.core.exceptions import ImproperlyConfigured
+
+A4 = (595, 842)
+KEEP_TABLES = (b'cvt ', b'fpgm', b'glyf', b'head', b'hhea', b'hmtx',
+               b'loca', b'maxp', b'prep')
+
+# Флаги составных глифов TrueType.
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+class TrueTypeFont:
+    """ Шрифт TrueType: метрики, таблица символов и подмножество глифов. """
+
+    def __init__(self, path):
+        self.name = Path(path).stem
+        self.data = Path(path).read_bytes()
+        num_tables, = unpack_from('>H', self.data, 4)
+        self.tables = {}
+        for i in range(num_tables):
+            tag, _, offset, length = unpack_from(
+                '>4sLLL', self.data, 12 + 16 * i
+            )
+            self.tables[tag] = (offset, length)
+
+        head = self.tables[b'head'][0]
+        self.units_per_em, = unpack_from('>H', self.data, head + 18)
+        self.bbox = [
+            self.scale(value)
+            for value in unpack_from('>4h', self.data, head + 36)
+        ]
+        long_loca, = unpack_from('>h', self.data, head + 50)
+
+        hhea = self.tables[b'hhea'][0]
+        ascent, descent = unpack_from('>2h', self.data, hhea + 4)
+        self.ascent, self.descent = self.scale(ascent), self.scale(descent)
+        num_metrics, = unpack_from('>H', self.data, hhea + 34)
+        self.num_glyphs, = unpack_from(
+            '>H', self.data, self.tables[b'maxp'][0] + 4
+        )
+
+        hmtx = self.tables[b'hmtx'][0]
+        self.widths = [
+            self.scale(unpack_from('>H', self.data, hmtx + 4 * i)[0])
+            for i in range(num_metrics)
+        ]
+        self.widths += [self.widths[-1]] * (self.num_glyphs - num_metrics)
+
+        loca = self.tables[b'loca'][0]
+        if long_loca:
+            self.loca = unpack_from(
+                f'>{self.num_glyphs + 1}L', self.data, loca
+            )
+        else:
+            self.loca = [
+                offset * 2 for offset in unpack_from(
+                    f'>{self.num_glyphs + 1}H', self.data, loca
+                )
+            ]
+        self.cmap = self._read_cmap()
+
+    def scale(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    def _read_cmap(self):
+        cmap = self.tables[b'cmap'][0]
+        num_subtables, = unpack_from('>H', self.data, cmap + 2)
+        subtables = {}
+        for i in range(num_subtables):
+            platform, encoding, offset = unpack_from(
+                '>HHL', self.data, cmap + 4 + 8 * i
+            )
+            subtables[platform, encoding] = cmap + offset
+        if (3, 10) in subtables:
+            return self._read_cmap_format_12(subtables[3, 10])
+        if (3, 1) in subtables:
+            return self._read_cmap_format_4(subtables[3, 1])
+        raise ImproperlyConfigured(
+            f'В шрифте {self.name} нет таблицы символов Unicode'
+        )
+
+    def _read_cmap_format_4(self, offset):
+        seg_count = unpack_from('>H', self.data, offset + 6)[0] // 2
+        ends = offset + 14
+        starts = ends + 2 * seg_count + 2
+        deltas = starts + 2 * seg_count
+        range_offsets = deltas + 2 * seg_count
+        mapping = {}
+        for i in range(seg_count):
+            end, = unpack_from('>H', self.data, ends + 2 * i)
+            start, = unpack_from('>H', self.data, starts + 2 * i)
+            delta, = unpack_from('>H', self.data, deltas + 2 * i)
+            position = range_offsets + 2 * i
+            range_offset, = unpack_from('>H', self.data, position)
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset:
+                    glyph, = unpack_from(
+                        '>H', self.data,
+                        position + range_offset + 2 * (code - start)
+                    )
+                    if glyph:
+                        glyph = (glyph + delta) & 0xFFFF
+                else:
+                    glyph = (code + delta) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    def _read_cmap_format_12(self, offset):
+        num_groups, = unpack_from('>L', self.data, offset + 12)
+        mapping = {}
+        for i in range(num_groups):
+            start, end, glyph = unpack_from(
+                '>3L', self.data, offset + 16 + 12 * i
+            )
+            for code in range(start, end + 1):
+                mapping[code] = glyph + code - start
+        return mapping
+
+    def glyph(self, char):
+        return self.cmap.get(ord(char), 0)
+
+    def text_width(self, text, size):
+        return sum(
+            self.widths[self.glyph(char)] for char in text
+        ) * size / 1000
+
+    def _glyph_data(self, glyph):
+        start = self.tables[b'glyf'][0]
+        return self.data[
+            start + self.loca[glyph]:start + self.loca[glyph + 1]
+        ]
+
+    def _components(self, glyph):
+        data = self._glyph_data(glyph)
+        if len(data) < 10 or unpack_from('>h', data)[0] >= 0:
+            return
+        offset = 10
+        flags = MORE_COMPONENTS
+        while flags & MORE_COMPONENTS:
+            flags, component = unpack_from('>HH', data, offset)
+            yield component
+            offset += 8 if flags & ARG_1_AND_2_ARE_WORDS else 6
+            if flags & WE_HAVE_A_SCALE:
+                offset += 2
+            elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                offset += 4
+            elif flags & WE_HAVE_A_TWO_BY_TWO:
+                offset += 8
+
+    def subset(self, glyphs):
+        """
+        Возвращает файл шрифта, в котором оставлены только нужные глифы.
+        Номера глифов не меняются, поэтому текст можно кодировать ими
+        напрямую (Identity-H).
+        """
+        keep = {0}
+        pending = list(glyphs)
+        while pending:
+            glyph = pending.pop()
+            if glyph not in keep:
+                keep.add(glyph)
+                pending.extend(self._components(glyph))
+
+        glyf, loca = bytearray(), []
+        for glyph in range(self.num_glyphs):
+            loca.append(len(glyf))
+            if glyph in keep:
+                glyf += self._glyph_data(glyph)
+                glyf += b'\0' * (-len(glyf) % 4)
+        loca.append(len(glyf))
+
+        tables = {}
+        for tag in KEEP_TABLES:
+            if tag in self.tables:
+                offset, length = self.tables[tag]
+                tables[tag] = self.data[offset:offset + length]
+        head = bytearray(tables[b'head'])
+        head[8:12] = b'\0\0\0\0'
+        head[50:52] = pack('>h', 1)
+        tables[b'head'] = bytes(head)
+        tables[b'glyf'] = bytes(glyf)
+        tables[b'loca'] = pack(f'>{len(loca)}L', *loca)
+        return build_font_file(tables)
+
+
+def table_checksum(data):
+    data += b'\0' * (-len(data) % 4)
+    return sum(unpack_from(f'>{len(data) // 4}L', data)) & 0xFFFFFFFF
+
+
+def build_font_file(tables):
+    """ Собирает файл TrueType из словаря таблиц. """
+    num_tables = len(tables)
+    entry_selector = num_tables.bit_length() - 1
+    search_range = 16 * 2 ** entry_selector
+    header = pack(
+        '>LHHHH', 0x00010000, num_tables, search_range, entry_selector,
+        num_tables * 16 - search_range
+    )
+    offset = len(header) + 16 * num_tables
+    directory, body = [], []
+    for tag in sorted(tables):
+        data = tables[tag]
+        directory.append(
+            pack('>4sLLL', tag, table_checksum(data), offset, len(data))
+        )
+        body.append(data + b'\0' * (-len(data) % 4))
+        offset += len(body[-1])
+    return header + b''.join(directory) + b''.join(body)
+
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    if not Path(path).is_file():
+        raise ImproperlyConfigured(f'Файл шрифта {path} не найден')
+    return TrueTypeFont(path)
+
+
+class PDFDocument:
+    """
+    Потоковая запись текстового PDF-документа.
+
+    Страницы отдаются клиенту по мере заполнения, шрифт встраивается
+    в конце документа только с использованными глифами.
+    """
+
+    CATALOG, PAGES, FONT, CID_FONT, DESCRIPTOR, FONT_FILE, TO_UNICODE = (
+        range(1, 8)
+    )
+
+    def __init__(self, font_path, font_size=12, leading=16, margin=50,
+                 page_size=A4):
+        self.font = load_font(font_path)
+        self.font_size = font_size
+        self.leading = leading
+        self.margin = margin
+        self.width, self.height = page_size
+        self.used = {}
+
+    def render(self, lines):
+        self.offset = 0
+        self.xref = {}
+        self.used = {}
+        yield self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+        pages = []
+        number = self.TO_UNICODE + 1
+        for page in self._paginate(lines):
+            content = zlib.compress(self._content(page))
+            yield self._stream(
+                number, content, b'/Filter /FlateDecode'
+            )
+            yield self._object(number + 1, (
+                b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>'
+                % (self.PAGES, self.width, self.height, self.FONT, number)
+            ))
+            pages.append(number + 1)
+            number += 2
+
+        yield from self._font_objects()
+        yield self._object(self.PAGES, (
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                b' '.join(b'%d 0 R' % page for page in pages), len(pages)
+            )
+        ))
+        yield self._object(
+            self.CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES
+        )
+        yield self._xref(number)
+
+    def _write(self, data):
+        self.offset += len(data)
+        return data
+
+    def _object(self, number, body):
+        self.xref[number] = self.offset
+        return self._write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def _stream(self, number, data, extra=b''):
+        return self._object(number, b'<< /Length %d %s >>\nstream\n%s\n'
+                                    b'endstream' % (len(data), extra, data))
+
+    def _xref(self, size):
+        rows = [b'xref\n0 %d\n0000000000 65535 f \n' % size]
+        for number in range(1, size):
+            rows.append(b'%010d 00000 n \n' % self.xref[number])
+        rows.append(
+            b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (size, self.CATALOG, self.offset)
+        )
+        return self._write(b''.join(rows))
+
+    def _wrap(self, line):
+        max_width = self.width - 2 * self.margin
+        if self.font.text_width(line, self.font_size) <= max_width:
+            yield line
+            return
+        current = ''
+        for word in line.split(' '):
+            candidate = f'{current} {word}' if current else word
+            if (current and self.font.text_width(candidate, self.font_size)
+                    > max_width):
+                yield current
+                current = word
+            else:
+                current = candidate
+        yield current
+
+    def _paginate(self, lines):
+        per_page = int((self.height - 2 * self.margin) // self.leading)
+        page, empty = [], True
+        for line in lines:
+            for part in self._wrap(line):
+                page.append(part)
+                if len(page) == per_page:
+                    yield page
+                    page, empty = [], False
+        if page or empty:
+            yield page
+
+    def _encode(self, text):
+        glyphs = []
+        for char in text:
+            glyph = self.font.glyph(char)
+            self.used.setdefault(glyph, char)
+            glyphs.append(b'%04X' % glyph)
+        return b'<%s>' % b''.join(glyphs)
+
+    def _content(self, page):
+        top = self.height - self.margin - self.font_size
+        rows = [b'BT /F1 %d Tf %d TL %d %d Td' % (
+            self.font_size, self.leading, self.margin, top
+        )]
+        rows.extend(b'%s Tj T*' % self._encode(line) for line in page)
+        rows.append(b'ET')
+        return b'\n'.join(rows)
+
+    def _font_objects(self):
+        font = self.font
+        glyphs = sorted(self.used)
+        tag = md5(repr(glyphs).encode()).hexdigest().upper()[:6]
+        tag = ''.join(chr(ord('A') + int(char, 16)) for char in tag)
+        base_font = f'/{tag}+{font.name}'.encode()
+
+        yield self._object(self.FONT, (
+            b'<< /Type /Font /Subtype /Type0 /BaseFont %s '
+            b'/Encoding /Identity-H /DescendantFonts [%d 0 R] '
+            b'/ToUnicode %d 0 R >>'
+            % (base_font, self.CID_FONT, self.TO_UNICODE)
+        ))
+        widths = b' '.join(
+            b'%d [%d]' % (glyph, font.widths[glyph]) for glyph in glyphs
+        )
+        yield self._object(self.CID_FONT, (
+            b'<< /Type /Font /Subtype /CIDFontType2 /BaseFont %s '
+            b'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+            b'/Supplement 0 >> /FontDescriptor %d 0 R '
+            b'/CIDToGIDMap /Identity /W [%s] >>'
+            % (base_font, self.DESCRIPTOR, widths)
+        ))
+        yield self._object(self.DESCRIPTOR, (
+            b'<< /Type /FontDescriptor /FontName %s /Flags 32 '
+            b'/FontBBox [%d %d %d %d] /ItalicAngle 0 /Ascent %d '
+            b'/Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>'
+            % (base_font, *font.bbox, font.ascent, font.descent,
+               font.ascent, self.FONT_FILE)
+        ))
+        font_file = font.subset(glyphs)
+        yield self._stream(
+            self.FONT_FILE, zlib.compress(font_file),
+            b'/Length1 %d /Filter /FlateDecode' % len(font_file)
+        )
+        yield self._stream(self.TO_UNICODE, self._to_unicode(glyphs))
+
+    def _to_unicode(self, glyphs):
+        rows = [
+            b'/CIDInit /ProcSet findresource begin',
+            b'12 dict begin',
+            b'begincmap',
+            b'/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+            b'/Supplement 0 >> def',
+            b'/CMapName /Adobe-Identity-UCS def',
+            b'/CMapType 2 def',
+            b'1 begincodespacerange',
+            b'<0000> <FFFF>',
+            b'endcodespacerange',
+        ]
+        for start in range(0, len(glyphs), 100):
+            chunk = glyphs[start:start + 100]
+            rows.append(b'%d beginbfchar' % len(chunk))
+            rows.extend(
+                b'<%04X> <%s>' % (
+                    glyph, self.used[glyph].encode('utf-16-be').hex().encode()
+                )
+                for glyph in chunk
+            )
+            rows.append(b'endbfchar')
+        rows += [
+            b'endcmap',
+            b'CMapName currentdict /CMap defineresource pop',
+            b'end',
+            b'end',
+        ]
+        return b'\n'.join(rows)
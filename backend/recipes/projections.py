@@ -0,0 +1,156 @@
+"""
+Быстрое чтение без сериализаторов DRF.
+
+Проекции строят тот же json, что сериализаторы для чтения
+(RecipeSerializer, TagSerializer, RecipeIngredientSerializer,
+CustomUserSerializer, SubscribeSerializer, CropRecipeSerializer),
+из строк .values(): поля извлекаются заранее собранными функциями,
+без дерева полей сериализатора на каждый объект. Ссылки на изображения
+получаются без адреса сервера, его добавляет absolute_urls. Совпадение
+с сериализаторами проверяют команда bench_serializers и тест
+recipes.tests.ProjectionsTest.
+"""
+from operator import itemgetter
+
+from django.core.files.storage import default_storage
+
+from .fields import variant_urls
+from .models import Recipe, RecipeIngredient, RecipeTag
+
+
+class Projection:
+    """
+    Словарь из строки .values().
+
+    Поле задаётся именем ключа строки (с приставкой prefix) или парой
+    (имя, функция от строки); values - поля для .values().
+    """
+
+    def __init__(self, *fields, prefix='', values=()):
+        self.fields = tuple(
+            (field, itemgetter(prefix + field)) if isinstance(field, str)
+            else field
+            for field in fields
+        )
+        self.values = tuple(
+            prefix + field for field in fields if isinstance(field, str)
+        ) + tuple(values)
+
+    def __call__(self, row):
+        return {name: get(row) for name, get in self.fields}
+
+
+def image_url(row):
+    return default_storage.url(row['image']) if row['image'] else None
+
+
+def image_variants(row):
+    return variant_urls(row['image'], row['image_variants'])
+
+
+def false(row):
+    return False
+
+
+TAG = Projection('id', 'name', 'color', 'slug', prefix='tag__')
+RECIPE_INGREDIENT = Projection(
+    'id', 'name', ('amount', itemgetter('amount')), 'measurement_unit',
+    prefix='ingredient__', values=['amount']
+)
+USER = Projection(
+    'id', 'email', 'username', 'first_name', 'last_name',
+    ('is_subscribed', itemgetter('is_subscribed'))
+)
+RECIPE = Projection(
+    'id', ('tags', itemgetter('tags')), ('author', itemgetter('author')),
+    ('ingredients', itemgetter('ingredients')),
+    ('is_favorited', false), ('is_in_shopping_cart', false),
+    'name', ('image', image_url), ('images', image_variants), 'text',
+    'cooking_time',
+    values=['author_id', 'image', 'image_variants']
+)
+CROP_RECIPE = Projection(
+    'id', 'name', ('image', image_url), ('images', image_variants),
+    'cooking_time', values=['author_id', 'image', 'image_variants']
+)
+
+
+def group(rows, projection, key='recipe_id'):
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[key], []).append(projection(row))
+    return groups
+
+
+def recipe_documents(recipe_ids):
+    """ Рецепты по id в виде RecipeSerializer для анонимного клиента. """
+    recipes = list(Recipe.objects.filter(id__in=recipe_ids).values(
+        *RECIPE.values, *(f'author__{name}' for name in USER.values)
+    ))
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    tags = group(
+        RecipeTag.objects.filter(recipe_id__in=recipe_ids)
+        .order_by('tag__name', 'tag_id').values('recipe_id', *TAG.values),
+        TAG
+    )
+    ingredients = group(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .order_by('id').values('recipe_id', *RECIPE_INGREDIENT.values),
+        RECIPE_INGREDIENT
+    )
+    return {
+        recipe['id']: RECIPE(dict(
+            recipe, author=USER(dict(
+                {name: recipe[f'author__{name}'] for name in USER.values},
+                is_subscribed=False
+            )),
+            tags=tags.get(recipe['id'], []),
+            ingredients=ingredients.get(recipe['id'], [])
+        ))
+        for recipe in recipes
+    }
+
+
+def users(rows, subscriptions):
+    """ Пользователи как CustomUserSerializer; subscriptions - id авторов. """
+    return [
+        USER(dict(row, is_subscribed=row['id'] in subscriptions))
+        for row in rows
+    ]
+
+
+def subscriptions(rows, recipes, request):
+    """
+    Авторы как SubscribeSerializer: rows - строки USER.values
+    и recipes_count, recipes - queryset рецептов авторов.
+    """
+    recent = group(
+        recipes.filter(
+            author_id__in=[row['id'] for row in rows]
+        ).values(*CROP_RECIPE.values),
+        CROP_RECIPE, key='author_id'
+    )
+    return [
+        dict(
+            USER(dict(row, is_subscribed=True)),
+            recipes=[
+                absolute_urls(recipe, request)
+                for recipe in recent.get(row['id'], [])
+            ],
+            recipes_count=row['recipes_count']
+        )
+        for row in rows
+    ]
+
+
+def absolute_urls(recipe, request):
+    """ Рецепт со ссылками на изображения от адреса сервера. """
+    recipe = dict(recipe)
+    if recipe['image']:
+        recipe['image'] = request.build_absolute_uri(recipe['image'])
+    if recipe['images']:
+        recipe['images'] = {
+            name: request.build_absolute_uri(url)
+            for name, url in recipe['images'].items()
+        }
+    return recipe
@@ -0,0 +1,112 @@
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone as django_timezone
+
+from .models import (Favorite, Recipe, RecipeScore, ScoreCheckpoint,
+                     ShoppingList)
+
+SCORE_EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+# Модель события, поле отметки в ScoreCheckpoint и настройка веса.
+EVENTS = (
+    (Favorite, 'last_favorite_id', 'SCORE_FAVORITE_WEIGHT'),
+    (ShoppingList, 'last_shopping_id', 'SCORE_SHOPPING_WEIGHT'),
+)
+
+
+def log_add(first, second):
+    """ log2(2 ** first + 2 ** second) без переполнения. """
+    if not first:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def popularity(favorites_count, in_carts_count):
+    return (
+        favorites_count * settings.SCORE_FAVORITE_WEIGHT
+        + in_carts_count * settings.SCORE_SHOPPING_WEIGHT
+    )
+
+
+def collect_events(checkpoint):
+    """
+    Суммарный вес новых событий по рецептам с последнего расчёта.
+    Сдвигает отметки checkpoint на последние учтённые записи.
+    """
+    weights = {}
+    for model, field, weight in EVENTS:
+        weight = getattr(settings, weight)
+        rows = model.objects.filter(
+            id__gt=getattr(checkpoint, field)
+        ).order_by().values('recipe_id').annotate(
+            count=Count('id'), last=Max('id')
+        )
+        for row in rows:
+            weights[row['recipe_id']] = (
+                weights.get(row['recipe_id'], 0) + row['count'] * weight
+            )
+            setattr(checkpoint, field, max(
+                getattr(checkpoint, field), row['last']
+            ))
+    return weights
+
+
+def update_scores(full=False, batch_size=1000):
+    """
+    Обновляет RecipeScore по событиям с прошлого запуска.
+
+    Время новых событий считается равным времени расчёта, поэтому
+    точность trending ограничена интервалом запуска. При full=True
+    popularity пересчитывается для всех рецептов (учитывает удаления).
+    Рецептам без RecipeScore (созданным через bulk_create) строка
+    создаётся при любом запуске. Возвращает число обработанных рецептов.
+    """
+    with transaction.atomic():
+        checkpoint, _ = (
+            ScoreCheckpoint.objects.select_for_update().get_or_create(pk=1)
+        )
+        weights = collect_events(checkpoint)
+        timestamp = django_timezone.now()
+        hours = (timestamp - SCORE_EPOCH).total_seconds() / 3600
+        decay = hours / settings.TRENDING_HALF_LIFE
+
+        ids = (
+            list(Recipe.objects.order_by('id').values_list('id', flat=True))
+            if full else sorted(set(weights).union(
+                Recipe.objects.filter(score__isnull=True).values_list(
+                    'id', flat=True
+                )
+            ))
+        )
+        for start in range(0, len(ids), batch_size):
+            counts = {
+                recipe_id: counters for recipe_id, *counters
+                in Recipe.objects.filter(
+                    id__in=ids[start:start + batch_size]
+                ).values_list('id', 'favorites_count', 'in_carts_count')
+            }
+            scores = RecipeScore.objects.in_bulk(counts)
+            new = []
+            for recipe_id, (favorites, carts) in counts.items():
+                score = scores.get(recipe_id)
+                if score is None:
+                    score = RecipeScore(recipe_id=recipe_id)
+                    new.append(score)
+                score.popularity = popularity(favorites, carts)
+                score.updated = timestamp
+                if weights.get(recipe_id):
+                    score.trending = log_add(
+                        score.trending,
+                        decay + math.log2(weights[recipe_id])
+                    )
+            RecipeScore.objects.bulk_update(
+                scores.values(), ['popularity', 'trending', 'updated']
+            )
+            RecipeScore.objects.bulk_create(new, ignore_conflicts=True)
+        checkpoint.save()
+    return len(ids)
@@ -0,0 +1,254 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from functools import partial
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection, transaction
+from django.db.models import (Case, F, FloatField, OuterRef, Subquery,
+                              Value, When)
+
+from foodgram.db.routers import read_from_primary
+from .models import Ingredient, Recipe, RecipeIngredient
+from .stemmer import tokenize
+
+
+def normalize(value):
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class ProcessIndex(ABC):
+    """
+    Индекс в памяти процесса.
+
+    Строится при первом обращении, сбрасывается сигналами и
+    перестраивается не реже раза в ttl секунд, чтобы подхватывать
+    изменения из других процессов. Подклассы задают ttl и _build.
+    """
+
+    def __init__(self):
+        self._data = None
+        self._lock = Lock()
+
+    def invalidate(self):
+        self._data = None
+
+    @abstractmethod
+    def _build(self):
+        """ Данные индекса; читаются с основной базы. """
+
+    def _get(self):
+        data = self._data
+        if self._expired(data):
+            with self._lock:
+                data = self._data
+                if self._expired(data):
+                    with read_from_primary():
+                        data = self._data = (self._build(), monotonic())
+        return data[0]
+
+    def _expired(self, data):
+        return data is None or monotonic() - data[1] > self.ttl
+
+
+class IngredientIndex(ProcessIndex):
+    """
+    Индекс названий ингредиентов для автодополнения.
+
+    Хранит отсортированный список нормализованных названий и ищет
+    по префиксу двоичным поиском, не обращаясь к базе данных.
+    Также отдаёт ингредиенты по id (get_many).
+    """
+
+    ttl = settings.INGREDIENT_INDEX_TTL
+
+    def _build(self):
+        entries = sorted(
+            (normalize(name), name, pk, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        ingredients = [
+            Ingredient(id=pk, name=name, measurement_unit=unit)
+            for _, name, pk, unit in entries
+        ]
+        return (
+            [entry[0] for entry in entries],
+            ingredients,
+            {ingredient.id: ingredient for ingredient in ingredients},
+        )
+
+    def get_many(self, ids):
+        """ Ингредиенты по id; созданных после построения индекса нет. """
+        by_id = self._get()[2]
+        return {pk: by_id[pk] for pk in ids if pk in by_id}
+
+    def search(self, query, limit=None):
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        keys, ingredients, _ = self._get()
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        found = ingredients[start:min(end, start + limit)]
+        if len(found) < limit and settings.INGREDIENT_SEARCH_FALLBACK:
+            found += self._fallback(
+                query, keys, ingredients, start, end, limit - len(found)
+            )
+        return found
+
+    def _fallback(self, query, keys, ingredients, start, end, limit):
+        """
+        Поиск по вхождению подстроки и нечёткий поиск по триграммам.
+
+        На PostgreSQL оба условия используют GIN-индексы pg_trgm:
+        icontains - индекс по UPPER(name), оператор % - индекс по name;
+        порог оператора % задаёт INGREDIENT_SEARCH_SIMILARITY.
+        """
+        if (settings.INGREDIENT_SEARCH_TRIGRAM
+                and connection.vendor == 'postgresql'):
+            from django.contrib.postgres.search import TrigramSimilarity
+            from django.db.models import Q
+
+            queryset = Ingredient.objects.filter(
+                Q(name__icontains=query) | Q(name__trigram_similar=query)
+            ).exclude(
+                id__in=[ingredient.id for ingredient in ingredients[start:end]]
+            ).annotate(
+                similarity=TrigramSimilarity('name', query)
+            ).order_by('-similarity', 'name')[:limit]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    'SET LOCAL pg_trgm.similarity_threshold = %s',
+                    [settings.INGREDIENT_SEARCH_SIMILARITY]
+                )
+                return list(queryset)
+        found = []
+        for position, key in enumerate(keys):
+            if len(found) == limit:
+                break
+            if query in key and not start <= position < end:
+                found.append(ingredients[position])
+        return found
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_vector():
+    """ Вектор рецепта: название (A), ингредиенты (B), описание (C). """
+    config = settings.RECIPE_SEARCH_CONFIG
+    ingredients = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredients), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+class RecipeSearchIndex(ProcessIndex):
+    """
+    Полнотекстовый поиск рецептов по названию, ингредиентам и описанию.
+
+    На PostgreSQL ищет по колонке Recipe.search_vector с GIN-индексом
+    и русской морфологией и сортирует по ts_rank, колонку обновляют
+    сигналы. На других базах использует инвертированный индекс процесса
+    с тем же стеммером, стоп-словами и весами полей, что у ts_rank.
+    """
+
+    ttl = settings.RECIPE_SEARCH_INDEX_TTL
+    weights = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+
+    @staticmethod
+    def native():
+        return connection.vendor == 'postgresql'
+
+    def search(self, queryset, query):
+        """ Подходящие под запрос рецепты с аннотацией search_rank. """
+        if self.native():
+            query = SearchQuery(
+                query, config=settings.RECIPE_SEARCH_CONFIG,
+                search_type='websearch'
+            )
+            return queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            )
+        ranked = self.rank(query)
+        if not ranked:
+            return queryset.none()
+        return queryset.filter(id__in=[pk for pk, _ in ranked]).annotate(
+            search_rank=Case(
+                *(When(id=pk, then=Value(score)) for pk, score in ranked),
+                output_field=FloatField()
+            )
+        )
+
+    def rank(self, query):
+        """
+        Рецепты, содержащие все слова запроса, и их вес: сумма весов
+        полей по вхождениям слов. Не больше RECIPE_SEARCH_LIMIT.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        postings = self._get()
+        scores = None
+        for term in terms:
+            found = postings.get(term, {})
+            if scores is None:
+                scores = dict(found)
+            else:
+                scores = {
+                    pk: scores[pk] + score
+                    for pk, score in found.items() if pk in scores
+                }
+            if not scores:
+                return []
+        return sorted(
+            scores.items(), key=lambda item: (-item[1], -item[0])
+        )[:settings.RECIPE_SEARCH_LIMIT]
+
+    def _build(self):
+        postings = {}
+
+        def add(recipe_id, text, field):
+            for term in tokenize(text):
+                scores = postings.setdefault(term, {})
+                scores[recipe_id] = (
+                    scores.get(recipe_id, 0) + self.weights[field]
+                )
+
+        for pk, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text'
+        ):
+            add(pk, name, 'name')
+            add(pk, text, 'text')
+        for pk, name in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient__name'
+        ):
+            add(pk, name, 'ingredients')
+        return postings
+
+    def update(self, recipe_ids):
+        """ Обновляет поиск после изменения рецептов (из сигналов). """
+        if self.native():
+            transaction.on_commit(partial(self.update_vectors, recipe_ids))
+        else:
+            self.invalidate()
+
+    def update_vectors(self, recipe_ids=None):
+        queryset = Recipe.objects.all()
+        if recipe_ids is not None:
+            queryset = queryset.filter(id__in=recipe_ids)
+        queryset.update(search_vector=search_vector())
+
+
+recipe_search = RecipeSearchIndex()
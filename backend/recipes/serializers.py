@@ -1,13 +1,19 @@
+from functools import partial
+
 from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from rest_framework import serializers, status
 from rest_framework.serializers import (IntegerField, ModelSerializer,
                                         ReadOnlyField, SerializerMethodField)
 
-from users.serializers import CustomUserSerializer
-from .fields import Base64ImageField, Hex2NameColor
-from .models import (Ingredient, Recipe, RecipeIngredient,
+from users.serializers import CropRecipeSerializer, CustomUserSerializer
+from .cache import get_user_flags
+from .cart import invalidate_recipe_carts
+from .documents import apply_user_flags, current_documents
+from .fields import Base64ImageField, Hex2NameColor, ImageVariantsField
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                      RecipeTag, ShoppingList, Tag)
+from .projections import absolute_urls
 
 
 class TagSerializer(ModelSerializer):
@@ -52,15 +58,19 @@ class RecipeSerializer(ModelSerializer):
     )
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = [
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'images', 'text',
+            'cooking_time'
         ]
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (
             False if request is None or request.user.is_anonymous
@@ -68,6 +78,8 @@ class RecipeSerializer(ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -92,9 +104,7 @@ class CreateRecipeSerializer(ModelSerializer):
 
     author = CustomUserSerializer(read_only=True)
     ingredients = AddIngredientRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = serializers.ListField(child=IntegerField(), allow_empty=False)
     image = Base64ImageField()
     cooking_time = serializers.IntegerField()
 
@@ -106,11 +116,15 @@ class CreateRecipeSerializer(ModelSerializer):
         ]
 
     def validate_tags(self, tags):
-        for tag in tags:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError(
-                    'Указанного тега не существует')
-        return tags
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError('Теги не должны повторяться')
+        found = Tag.objects.in_bulk(tags)
+        missing = [tag for tag in tags if tag not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Указанных тегов не существует: {missing}'
+            )
+        return [found[tag] for tag in tags]
 
     def validate_cooking_time(self, cooking_time):
         if cooking_time < settings.MIN_VALUE_COOKING_TIME:
@@ -139,15 +153,22 @@ class CreateRecipeSerializer(ModelSerializer):
                     'ingredient': 'Ингредиенты не должны повторяться'
                 })
             ingredients.append(ingredient['id'])
+
+        found = Ingredient.objects.in_bulk(ingredients)
+        missing = [pk for pk in ingredients if pk not in found]
+        if missing:
+            raise serializers.ValidationError({
+                'ingredient': f'Ингредиенты не существуют: {missing}'
+            })
+        for ingredient in data:
+            ingredient['ingredient'] = found[ingredient['id']]
         return data
 
     def create_ingredients(self, ingredients, recipe):
         RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
-                ingredient=get_object_or_404(
-                    Ingredient, id=ingredient['id']
-                ),
-                recipe=recipe, amount=ingredient.pop('amount')
+                ingredient=ingredient['ingredient'],
+                recipe=recipe, amount=ingredient['amount']
             )
             for ingredient in ingredients
         ])
@@ -158,6 +179,42 @@ class CreateRecipeSerializer(ModelSerializer):
             for tag in tags
         ])
 
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Применяет к ингредиентам рецепта только изменения,
+        возвращает True, если состав изменился.
+        """
+        existing = {
+            item.ingredient_id: item
+            for item in recipe.recipe_ingredients.all()
+        }
+        to_create, to_update = [], []
+        for ingredient in ingredients:
+            item = existing.pop(ingredient['id'], None)
+            if item is None:
+                to_create.append(ingredient)
+            elif item.amount != ingredient['amount']:
+                item.amount = ingredient['amount']
+                to_update.append(item)
+        if existing:
+            RecipeIngredient.objects.filter(
+                id__in=[item.id for item in existing.values()]
+            ).delete()
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        self.create_ingredients(to_create, recipe)
+        return bool(existing or to_update or to_create)
+
+    def update_tags(self, tags, recipe):
+        """ Добавляет новые теги рецепта и удаляет лишние. """
+        existing = set(recipe.recipe_tag.values_list('tag_id', flat=True))
+        removed = existing - {tag.id for tag in tags}
+        if removed:
+            recipe.recipe_tag.filter(tag_id__in=removed).delete()
+        self.create_tags(
+            [tag for tag in tags if tag.id not in existing], recipe
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -166,27 +223,52 @@ class CreateRecipeSerializer(ModelSerializer):
         self.create_tags(tags, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.recipe_tag.clear()
-        instance.recipe_ingredients.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
         instance = super().update(instance, validated_data)
-        self.create_ingredients(ingredients, instance)
-        self.create_tags(tags, instance)
+        if ingredients is not None and self.update_ingredients(
+            ingredients, instance
+        ):
+            # bulk_create, bulk_update и удаление не отправляют сигналы
+            # по строкам, итоги корзин сбрасываются один раз.
+            transaction.on_commit(
+                partial(invalidate_recipe_carts, instance.id)
+            )
+        if tags is not None:
+            self.update_tags(tags, instance)
         return instance
 
     def to_representation(self, instance):
-        return RecipeSerializer(instance, context={
-            'request': self.context.get('request')
-        }).data
+        """ Рецепт из его документа, как RecipeSerializer. """
+        request = self.context.get('request')
+        document = absolute_urls(
+            current_documents([instance.pk])[instance.pk], request
+        )
+        return apply_user_flags(
+            [document], get_user_flags(request.user)
+        )[0]
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """ Список id рецептов или авторов для пакетной операции. """
+
+    ids = serializers.ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False, max_length=settings.BULK_MAX_ITEMS
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
 
 
 class FavoriteSerializer(ModelSerializer):
     """ Сериализатор избранного. """
 
-    class Meta(RecipeSerializer.Meta):
-        fields = ('name', 'cooking_time')
+    class Meta:
+        model = Favorite
+        fields = ('user', 'recipe')
 
     def validate(self, data):
         user = data['user']
@@ -198,16 +280,17 @@ class FavoriteSerializer(ModelSerializer):
         return data
 
     def to_representation(self, instance):
-        return RecipeSerializer(instance, context={
+        return CropRecipeSerializer(instance.recipe, context={
             'request': self.context.get('request')
         }).data
 
 
-class ShoppingListSerializer(RecipeSerializer):
+class ShoppingListSerializer(FavoriteSerializer):
     """ Сериализатор списка покупок. """
 
-    class Meta(RecipeSerializer.Meta):
-        fields = ('name', 'cooking_time')
+    class Meta:
+        model = ShoppingList
+        fields = ('user', 'recipe')
 
     def validate(self, data):
         user = data['user']
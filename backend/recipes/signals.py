@@ -0,0 +1,260 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial, wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from users.models import User
+from .cache import (bump_catalog_version, bump_recipe_versions,
+                    user_flags_key)
+from .cart import add_to_cart, remove_from_cart
+from .documents import schedule_documents
+from .images import schedule_image_processing
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeScore, RecipeTag, ShoppingList, Tag)
+from .search import ingredient_index, recipe_search
+
+# Пакетные вставка и удаление связей пользователя (AddDelMixin
+# .bulk_add_del) без сигналов по строкам: sender - модель, user_id,
+# ids - id рецептов или авторов добавленных или удалённых строк.
+bulk_created = Signal()
+bulk_deleted = Signal()
+
+_muted = ContextVar('muted_row_signals', default=frozenset())
+
+
+@contextmanager
+def without_row_signals(model):
+    """
+    Приёмники row_receiver модели пропускают сигналы внутри блока:
+    пакетное изменение сообщает о себе сигналом bulk_created/deleted.
+    """
+    token = _muted.set(_muted.get() | {model})
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def row_receiver(function):
+    """ Приёмник сигнала по строке, отключаемый without_row_signals. """
+    @wraps(function)
+    def wrapper(sender, **kwargs):
+        if sender not in _muted.get():
+            function(sender=sender, **kwargs)
+    return wrapper
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(instance, **kwargs):
+    recipe_search.update([instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_search(**kwargs):
+    recipe_search.invalidate()
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def update_recipe_ingredients_search(instance, **kwargs):
+    recipe_search.update([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(instance, created, **kwargs):
+    if not created:
+        recipe_search.update(RecipeIngredient.objects.filter(
+            ingredient=instance
+        ).values('recipe_id'))
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_catalog_cache(**kwargs):
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe_cache(instance, **kwargs):
+    bump_recipe_versions([instance.id])
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver([post_save, post_delete], sender=RecipeTag)
+def invalidate_recipe_relations_cache(instance, **kwargs):
+    bump_recipe_versions([instance.recipe_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes_cache(instance, created, update_fields=None,
+                                    **kwargs):
+    if created or not instance.public_fields_changed(update_fields):
+        return
+    bump_recipe_versions(
+        instance.recipes.values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    """
+    Подключён раньше update_recipe_document: при синхронной обработке
+    варианты изображения успевают попасть в первую же сборку документа.
+    """
+    variants = instance.image_variants or {}
+    if instance.image and variants.get('source') != instance.image.name:
+        transaction.on_commit(
+            partial(schedule_image_processing, instance.id)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_document(instance, **kwargs):
+    schedule_documents([instance.id])
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver([post_save, post_delete], sender=RecipeTag)
+def update_recipe_relations_document(instance, **kwargs):
+    schedule_documents([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_documents(instance, created, **kwargs):
+    if not created:
+        schedule_documents(RecipeIngredient.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def update_tag_recipes_documents(instance, created, **kwargs):
+    if not created:
+        schedule_documents(RecipeTag.objects.filter(
+            tag=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def update_author_recipes_documents(instance, created, update_fields=None,
+                                    **kwargs):
+    if created or not instance.public_fields_changed(update_fields):
+        return
+    schedule_documents(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_cart_totals(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            partial(add_to_cart, instance.user_id, [instance.recipe_id])
+        )
+
+
+@receiver(bulk_created, sender=ShoppingList)
+def bulk_add_cart_totals(user_id, ids, **kwargs):
+    transaction.on_commit(partial(add_to_cart, user_id, ids))
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+@row_receiver
+def invalidate_user_flags_on_delete(instance, **kwargs):
+    """ Удаление вместе с рецептом или пользователем, минуя AddDelMixin. """
+    cache.delete(user_flags_key(instance.user_id))
+
+
+@receiver(post_delete, sender=ShoppingList)
+@row_receiver
+def remove_cart_totals(instance, **kwargs):
+    transaction.on_commit(
+        partial(remove_from_cart, instance.user_id, [instance.recipe_id])
+    )
+
+
+@receiver(bulk_deleted, sender=ShoppingList)
+def bulk_remove_cart_totals(user_id, ids, **kwargs):
+    transaction.on_commit(partial(remove_from_cart, user_id, ids))
+
+
+def change_counter(model, pk, field, delta):
+    """ Атомарно изменяет счётчик, не опуская его ниже нуля. """
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """ change_counter для нескольких объектов одним UPDATE. """
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@row_receiver
+def decrement_favorites_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingList)
+def increment_in_carts_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingList)
+@row_receiver
+def decrement_in_carts_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(bulk_created, sender=Favorite)
+def bulk_increment_favorites_count(ids, **kwargs):
+    change_counters(Recipe, ids, 'favorites_count', 1)
+
+
+@receiver(bulk_deleted, sender=Favorite)
+def bulk_decrement_favorites_count(ids, **kwargs):
+    change_counters(Recipe, ids, 'favorites_count', -1)
+
+
+@receiver(bulk_created, sender=ShoppingList)
+def bulk_increment_in_carts_count(ids, **kwargs):
+    change_counters(Recipe, ids, 'in_carts_count', 1)
+
+
+@receiver(bulk_deleted, sender=ShoppingList)
+def bulk_decrement_in_carts_count(ids, **kwargs):
+    change_counters(Recipe, ids, 'in_carts_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_score(instance, created, **kwargs):
+    if created:
+        RecipeScore.objects.get_or_create(recipe=instance)
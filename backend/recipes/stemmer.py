@@ -0,0 +1,133 @@
+"""
+Стеммер Snowball для русского языка (тот же алгоритм, что в словаре
+russian_stem PostgreSQL) и стоп-слова из russian.stop.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись')
+PERFECTIVE_GERUND_AFTER_A = ('в', 'вши', 'вшись')
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею'
+)
+PARTICIPLE = ('ивш', 'ывш', 'ующ')
+PARTICIPLE_AFTER_A = ('ем', 'нн', 'вш', 'ющ', 'щ')
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+    'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+    'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'
+)
+VERB_AFTER_A = (
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+    'ют', 'ны', 'ть', 'ешь', 'нно'
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'
+)
+SUPERLATIVE = ('ейш', 'ейше')
+DERIVATIONAL = ('ост', 'ость')
+
+STOP_WORDS = frozenset((
+    'и в во не что он на я с со как а то все она так его но да ты к у же '
+    'вы за бы по только ее мне было вот от меня еще нет о из ему теперь '
+    'когда даже ну вдруг ли если уже или ни быть был него до вас нибудь '
+    'опять уж вам ведь там потом себя ничего ей может они тут где есть '
+    'надо ней для мы тебя их чем была сам чтоб без будто чего раз тоже '
+    'себе под будет ж тогда кто этот того потому этого какой совсем ним '
+    'здесь этом один почти мой тем чтобы нее сейчас были куда зачем всех '
+    'никогда можно при наконец два об другой хоть после над больше тот '
+    'через эти нас про всего них какая много разве три эту моя впрочем '
+    'хорошо свою этой перед иногда лучше чуть том нельзя такой им более '
+    'всегда конечно всю между'
+).split())
+
+WORD = re.compile(r'\w+')
+
+
+def _after(word, start, vowel):
+    """ Позиция после первой гласной (согласной) начиная со start. """
+    for position in range(start, len(word)):
+        if (word[position] in VOWELS) == vowel:
+            return position + 1
+    return len(word)
+
+
+def _match(word, start, suffixes, after_a=()):
+    """
+    Длина слова без самого длинного окончания из suffixes или after_a,
+    лежащего не левее start; окончания after_a должны идти после
+    «а» или «я». None, если окончание не найдено.
+    """
+    found = max(
+        (suffix for suffix in suffixes + after_a
+         if word.endswith(suffix) and len(word) - len(suffix) >= start),
+        key=len, default=None
+    )
+    if found is None:
+        return None
+    end = len(word) - len(found)
+    if found in after_a and not (end > start and word[end - 1] in 'ая'):
+        return None
+    return end
+
+
+def _adjectival(word, start):
+    end = _match(word, start, ADJECTIVE)
+    if end is None:
+        return None
+    participle = _match(word[:end], start, PARTICIPLE, PARTICIPLE_AFTER_A)
+    return end if participle is None else participle
+
+
+def _inflection(word, rv):
+    """
+    Слово без окончания деепричастия, прилагательного, глагола
+    или существительного (шаг 1 алгоритма).
+    """
+    end = _match(word, rv, PERFECTIVE_GERUND, PERFECTIVE_GERUND_AFTER_A)
+    if end is None:
+        end = _match(word, rv, REFLEXIVE)
+        if end is not None:
+            word = word[:end]
+        end = _adjectival(word, rv)
+        if end is None:
+            end = _match(word, rv, VERB, VERB_AFTER_A)
+        if end is None:
+            end = _match(word, rv, NOUN)
+    return word if end is None else word[:end]
+
+
+def stem(word):
+    word = word.casefold().replace('ё', 'е')
+    rv = _after(word, 0, vowel=True)
+    r2 = _after(word, _after(word, _after(word, rv, False), True), False)
+
+    word = _inflection(word, rv)
+    if word.endswith('и') and len(word) > rv:
+        word = word[:-1]
+    end = _match(word, r2, DERIVATIONAL)
+    if end is not None:
+        word = word[:end]
+
+    end = _match(word, rv, SUPERLATIVE)
+    if end is not None:
+        word = word[:end]
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    elif end is None and word.endswith('ь') and len(word) > rv:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """ Основы слов текста без стоп-слов. """
+    return [
+        stem(word) for word in WORD.findall(text.casefold().replace('ё', 'е'))
+        if word not in STOP_WORDS
+    ]
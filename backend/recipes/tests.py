@@ -0,0 +1,725 @@
+import json
+import os
+import re
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from pypdf import PdfReader
+from rest_framework.test import APIClient
+
+from users.models import Subscription, User
+from .cache import CATALOG_VERSION_KEY
+from .documents import build_documents
+from .management.commands.bench_serializers import (
+    Command as BenchSerializersCommand
+)
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeScore, RecipeTag, ShoppingList, Tag)
+from .pagination import KeysetPagination
+from .pdf import PDFDocument
+from .scores import update_scores
+from .search import RecipeSearchIndex, ingredient_index, recipe_search
+from .stemmer import stem, tokenize
+
+TEST_SETTINGS = {
+    'CACHES': {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    }},
+    'IMAGE_PROCESSING_WORKERS': 0,
+}
+
+
+def create_recipes(count, authors, tags, ingredients):
+    """ Рецепты с ингредиентами и тегами без сигналов и изображений. """
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            author=authors[number % len(authors)], name=f'Рецепт {number}',
+            text='Описание', cooking_time=number % 60 + 1
+        )
+        for number in range(count)
+    ])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for recipe in recipes for ingredient in ingredients[:3]
+    ])
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe=recipe, tag=tag)
+        for recipe in recipes for tag in tags
+    ])
+    RecipeScore.objects.bulk_create([
+        RecipeScore(recipe=recipe) for recipe in recipes
+    ])
+    build_documents([recipe.id for recipe in recipes])
+    return recipes
+
+
+@override_settings(**TEST_SETTINGS)
+class RecipeListQueriesTest(TestCase):
+    """ Число запросов списка рецептов не зависит от размера страницы. """
+
+    # Подсчёт, id страницы, документы рецептов и три множества флагов
+    # пользователя; на прогретом кэше - только подсчёт и id страницы.
+    COLD_QUERIES = 6
+    WARM_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *authors = User.objects.bulk_create([
+            User(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for number in range(4)
+        ])
+        tags = Tag.objects.bulk_create([
+            Tag(name='Завтрак', color='#E26C2D', slug='breakfast'),
+            Tag(name='Обед', color='#49B64E', slug='lunch'),
+        ])
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        ])
+        recipes = create_recipes(120, authors, tags, ingredients)
+        Favorite.objects.bulk_create([
+            Favorite(user=cls.user, recipe=recipe) for recipe in recipes[::3]
+        ])
+        ShoppingList.objects.bulk_create([
+            ShoppingList(user=cls.user, recipe=recipe)
+            for recipe in recipes[::5]
+        ])
+        Subscription.objects.create(user=cls.user, author=authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_list_queries(self, limit):
+        path = f'/api/recipes/?limit={limit}'
+        with self.assertNumQueries(self.COLD_QUERIES):
+            response = self.client.get(path)
+        self.assertEqual(len(response.json()['results']), limit)
+        with self.assertNumQueries(self.WARM_QUERIES):
+            self.client.get(path)
+
+    def test_page_of_6(self):
+        self.assert_list_queries(6)
+
+    def test_page_of_100(self):
+        self.assert_list_queries(100)
+
+
+@override_settings(**TEST_SETTINGS)
+class KeysetPaginationTest(TestCase):
+    """ Постраничный вывод по курсору для рецептов и подписок. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *authors = User.objects.bulk_create([
+            User(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for number in range(4)
+        ])
+        create_recipes(5, authors, [], [])
+        Subscription.objects.bulk_create([
+            Subscription(user=cls.user, author=author) for author in authors
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def pages(self, path):
+        ids = []
+        url = f'{path}?cursor=&limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    def test_pages_follow_ordering(self):
+        self.assertEqual(self.pages('/api/recipes/'), list(
+            Recipe.objects.order_by('-created', '-id').values_list(
+                'id', flat=True
+            )
+        ))
+        self.assertEqual(self.pages('/api/users/subscriptions/'), list(
+            Subscription.objects.order_by('-id').values_list(
+                'author_id', flat=True
+            )
+        ))
+
+    def test_malformed_cursor_is_not_found(self):
+        created = Recipe.objects.latest('created').created.isoformat()
+        for path, positions in (
+            ('/api/recipes/', (
+                ['bad', 1], [created, 'x'], [None, None], [created, None],
+                [{}, 1], [created, [1]], [created], 'x',
+            )),
+            ('/api/users/subscriptions/', (
+                ['x'], [None], [[1]], [1, 2], {},
+            )),
+        ):
+            for position in positions:
+                cursor = KeysetPagination(()).encode_cursor(position, False)
+                with self.subTest(path=path, position=position):
+                    response = self.client.get(path, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 404)
+            with self.subTest(path=path, cursor='garbage'):
+                response = self.client.get(path, {'cursor': '!!!'})
+                self.assertEqual(response.status_code, 404)
+
+
+@override_settings(**TEST_SETTINGS)
+class ScoreOrderingTest(TestCase):
+    """ Сортировка по предрасчитанным оценкам RecipeScore. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, author = User.objects.bulk_create([
+            User(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for number in range(2)
+        ])
+        cls.recipes = Recipe.objects.bulk_create([
+            Recipe(
+                author=author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10
+            )
+            for number in range(4)
+        ])
+        Favorite.objects.bulk_create([
+            Favorite(user=cls.user, recipe=cls.recipes[1]),
+        ])
+        ShoppingList.objects.bulk_create([
+            ShoppingList(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes[1:3]
+        ])
+        Recipe.objects.filter(id=cls.recipes[1].id).update(
+            favorites_count=1, in_carts_count=1
+        )
+        Recipe.objects.filter(id=cls.recipes[2].id).update(in_carts_count=1)
+        build_documents([recipe.id for recipe in cls.recipes])
+
+    def setUp(self):
+        cache.clear()
+
+    def ordered(self, ordering):
+        response = APIClient().get('/api/recipes/', {'ordering': ordering})
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_update_scores_creates_missing_rows(self):
+        self.assertFalse(RecipeScore.objects.exists())
+        update_scores()
+        self.assertEqual(
+            set(RecipeScore.objects.values_list('recipe_id', flat=True)),
+            {recipe.id for recipe in self.recipes}
+        )
+
+    def test_orders_by_score_then_recipe(self):
+        update_scores()
+        first, favorite, in_cart, last = [
+            recipe.id for recipe in self.recipes
+        ]
+        self.assertEqual(
+            self.ordered('-popularity'), [favorite, in_cart, last, first]
+        )
+        self.assertEqual(
+            self.ordered('popularity'), [first, last, in_cart, favorite]
+        )
+        self.assertEqual(
+            self.ordered('-trending'), [favorite, in_cart, last, first]
+        )
+
+    def test_created_recipe_gets_score(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name='Новый', text='Описание', cooking_time=5
+        )
+        self.assertTrue(RecipeScore.objects.filter(recipe=recipe).exists())
+
+
+@override_settings(**TEST_SETTINGS)
+class BulkRelationsTest(TestCase):
+    """ Пакетное добавление и удаление избранного, корзины и подписок. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *cls.authors = User.objects.bulk_create([
+            User(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for number in range(4)
+        ])
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        ])
+        cls.recipes = create_recipes(10, cls.authors, [], ingredients)
+        cls.missing = cls.recipes[-1].id + 1000
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingList.objects.create(user=cls.user, recipe=cls.recipes[0])
+        Subscription.objects.create(user=cls.user, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def change(self, method, path, ids):
+        response = getattr(self.client, method)(
+            path, {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['status'] for item in response.json()['results']]
+
+    def counter(self, recipe, field):
+        return Recipe.objects.values_list(field, flat=True).get(id=recipe.id)
+
+    def assert_recipe_relations(self, path, model, field):
+        first, second, third = self.recipes[:3]
+        self.assertEqual(
+            self.change('post', path, [first.id, second.id, self.missing]),
+            ['exists', 'added', 'not_found']
+        )
+        self.assertEqual(self.counter(first, field), 1)
+        self.assertEqual(self.counter(second, field), 1)
+        self.assertEqual(
+            self.change('delete', path, [first.id, third.id, self.missing]),
+            ['removed', 'absent', 'not_found']
+        )
+        self.assertEqual(self.counter(first, field), 0)
+        self.assertEqual(self.counter(third, field), 0)
+        self.assertEqual(
+            list(model.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )),
+            [second.id]
+        )
+
+    def test_favorites(self):
+        self.assert_recipe_relations(
+            '/api/recipes/favorite/', Favorite, 'favorites_count'
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in self.client.get(
+                '/api/recipes/', {'is_favorited': 1}
+            ).json()['results']],
+            [self.recipes[1].id]
+        )
+
+    def test_shopping_cart(self):
+        path = '/api/recipes/shopping_cart/'
+        self.assertEqual(self.client.get(path).json()['recipes'], 1)
+        self.assert_recipe_relations(path, ShoppingList, 'in_carts_count')
+        totals = self.client.get(path).json()
+        self.assertEqual(totals['recipes'], 1)
+        self.assertEqual(
+            [row['amount'] for row in totals['ingredients']], [10, 10, 10]
+        )
+
+    def test_subscriptions(self):
+        path = '/api/users/subscribe/'
+        first, second, third = self.authors
+        self.assertEqual(
+            self.change('post', path, [
+                self.user.id, first.id, second.id, self.missing
+            ]),
+            ['forbidden', 'exists', 'added', 'not_found']
+        )
+        self.assertEqual(
+            self.change('delete', path, [
+                self.user.id, first.id, third.id, self.missing
+            ]),
+            ['forbidden', 'removed', 'absent', 'not_found']
+        )
+        self.assertEqual(
+            list(Subscription.objects.filter(user=self.user).values_list(
+                'author_id', flat=True
+            )),
+            [second.id]
+        )
+
+    def test_queries_do_not_depend_on_ids(self):
+        path = '/api/recipes/shopping_cart/'
+        counts = []
+        for recipes in (self.recipes[:2], self.recipes[2:10]):
+            ids = [recipe.id for recipe in recipes]
+            for method in ('post', 'delete'):
+                with CaptureQueriesContext(connection) as queries:
+                    self.change(method, path, ids)
+                counts.append((method, len(queries)))
+        self.assertEqual(counts[:2], counts[2:])
+
+
+class StemmerTest(SimpleTestCase):
+    """ Русский стеммер и разбор текста для поиска рецептов. """
+
+    def test_word_forms_share_stem(self):
+        for forms in (
+            ('пирог', 'пироги', 'пирогами'),
+            ('капуста', 'капусты', 'капустой'),
+            ('омлет', 'омлеты'),
+        ):
+            self.assertEqual(len({stem(word) for word in forms}), 1, forms)
+
+    def test_tokenize_drops_stop_words(self):
+        self.assertEqual(
+            tokenize('Пирог с капустой и луком'),
+            [stem('пирог'), stem('капуста'), stem('лук')]
+        )
+
+
+class RecipeSearchMixin:
+    """
+    Рецепты для поиска: слово в названии весит больше, чем в списке
+    ингредиентов, а тот - больше, чем в описании.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия'
+        )
+        flour, cabbage, egg = Ingredient.objects.bulk_create([
+            Ingredient(name='Мука', measurement_unit='г'),
+            Ingredient(name='Капуста', measurement_unit='г'),
+            Ingredient(name='Яйцо', measurement_unit='шт'),
+        ])
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.pie = cls.create_recipe(
+                author, 'Пирог с капустой', 'Простое тесто',
+                [flour, cabbage]
+            )
+            cls.soup = cls.create_recipe(
+                author, 'Щи', 'Суп с капустой, подавать с пирогами',
+                [cabbage]
+            )
+            cls.omelette = cls.create_recipe(
+                author, 'Омлет', 'Взбить яйца', [egg]
+            )
+
+    @staticmethod
+    def create_recipe(author, name, text, ingredients):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text=text, cooking_time=10
+        )
+        for ingredient in ingredients:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+        recipe_search.invalidate()
+
+    def search(self, query):
+        response = APIClient().get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_ranks_name_above_ingredients_and_text(self):
+        self.assertEqual(
+            self.search('капуста'), [self.pie.id, self.soup.id]
+        )
+
+    def test_matches_other_word_forms(self):
+        self.assertEqual(self.search('пироги'), [self.pie.id, self.soup.id])
+        self.assertEqual(self.search('омлеты'), [self.omelette.id])
+
+    def test_requires_every_word(self):
+        self.assertEqual(self.search('щи с пирогами'), [self.soup.id])
+        self.assertEqual(self.search('борщ'), [])
+
+
+@override_settings(**TEST_SETTINGS)
+@mock.patch.object(RecipeSearchIndex, 'native', staticmethod(lambda: False))
+class RecipeSearchIndexTest(RecipeSearchMixin, TestCase):
+    """ Инвертированный индекс процесса (SQLite и другие базы). """
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.search('яичница'), [])
+        self.omelette.name = 'Яичница'
+        self.omelette.save()
+        self.assertEqual(self.search('яичница'), [self.omelette.id])
+
+
+@override_settings(**TEST_SETTINGS)
+@skipUnless(connection.vendor == 'postgresql', 'нужен PostgreSQL')
+class RecipeSearchVectorTest(RecipeSearchMixin, TestCase):
+    """ Колонка search_vector и ts_rank на PostgreSQL. """
+
+    def test_vectors_are_filled(self):
+        self.assertFalse(
+            Recipe.objects.filter(search_vector__isnull=True).exists()
+        )
+
+    def test_vector_follows_changes(self):
+        self.assertEqual(self.search('яичница'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.omelette.name = 'Яичница'
+            self.omelette.save()
+        self.assertEqual(self.search('яичница'), [self.omelette.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            egg = Ingredient.objects.get(name='Яйцо')
+            egg.name = 'Перепелиное яйцо'
+            egg.save()
+        self.assertEqual(self.search('перепелиное'), [self.omelette.id])
+
+
+@override_settings(
+    INGREDIENT_SEARCH_FALLBACK=True, INGREDIENT_SEARCH_TRIGRAM=True,
+    INGREDIENT_SEARCH_SIMILARITY=0.3
+)
+@skipUnless(connection.vendor == 'postgresql', 'нужен PostgreSQL')
+class IngredientTrigramSearchTest(TestCase):
+    """ Поиск ингредиентов по подстроке и с опечатками на PostgreSQL. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cabbage, cls.sauerkraut, cls.carrot = (
+            Ingredient.objects.bulk_create([
+                Ingredient(name='капуста белокочанная', measurement_unit='г'),
+                Ingredient(name='квашеная капуста', measurement_unit='г'),
+                Ingredient(name='морковь', measurement_unit='г'),
+            ])
+        )
+
+    def setUp(self):
+        ingredient_index.invalidate()
+
+    def search(self, query):
+        return [
+            ingredient.id for ingredient in ingredient_index.search(query)
+        ]
+
+    def test_prefix_matches_come_first(self):
+        self.assertEqual(
+            self.search('капуста'), [self.cabbage.id, self.sauerkraut.id]
+        )
+
+    def test_matches_typos(self):
+        self.assertEqual(self.search('марковь'), [self.carrot.id])
+        self.assertEqual(self.search('квашенная капуста')[0],
+                         self.sauerkraut.id)
+
+
+@override_settings(**TEST_SETTINGS)
+class DownloadShoppingCartTest(TestCase):
+    """ Выгрузка списка покупок: файл или ошибка в json. """
+
+    path = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='user', email='user@example.com',
+            first_name='Имя', last_name='Фамилия'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assert_json_error(self, response, status_code):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', response.json())
+
+    def test_anonymous_gets_json_error(self):
+        self.assert_json_error(self.client.get(self.path), 401)
+
+    def test_unknown_format_gets_json_error(self):
+        self.client.force_authenticate(self.user)
+        self.assert_json_error(
+            self.client.get(self.path, {'format': 'doc'}), 404
+        )
+
+    def test_downloads_file(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.path, {'format': 'txt'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_downloads_pdf(self):
+        ingredient = Ingredient.objects.create(
+            name='Щавель', measurement_unit='г'
+        )
+        recipe, = create_recipes(1, [self.user], [], [ingredient])
+        ShoppingList.objects.create(user=self.user, recipe=recipe)
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        reader = PdfReader(
+            BytesIO(b''.join(response.streaming_content)), strict=True
+        )
+        text = reader.pages[0].extract_text()
+        self.assertIn('Список покупок', text)
+        self.assertIn('Щавель (г) — 10', text)
+
+
+@skipUnless(os.path.exists(settings.SHOPPING_LIST_FONT), 'нет шрифта')
+class PDFDocumentTest(SimpleTestCase):
+    """ Документ читается сторонним парсером: страницы, текст, xref. """
+
+    lines = [f'{number}. Ингредиент № {number} — 10 г'
+             for number in range(100)]
+
+    def render(self, lines):
+        return b''.join(
+            PDFDocument(settings.SHOPPING_LIST_FONT).render(lines)
+        )
+
+    def test_xref_offsets(self):
+        data = self.render(self.lines)
+        startxref = int(re.search(rb'startxref\n(\d+)\n', data)[1])
+        self.assertTrue(data[startxref:].startswith(b'xref\n'))
+        table = data[startxref:].split(b'trailer')[0].splitlines()[3:]
+        for number, row in enumerate(table, 1):
+            offset = int(row.split()[0])
+            self.assertTrue(
+                data[offset:].startswith(b'%d 0 obj\n' % number), number
+            )
+
+    def test_pages_and_text(self):
+        reader = PdfReader(BytesIO(self.render(self.lines)), strict=True)
+        # На странице A4 с полями 50pt помещается 46 строк.
+        self.assertEqual(len(reader.pages), 3)
+        for number, page in enumerate(reader.pages):
+            self.assertEqual(
+                page.extract_text().splitlines(),
+                self.lines[number * 46:(number + 1) * 46]
+            )
+
+    def test_long_line_is_wrapped(self):
+        line = ' '.join(['Длинная строка списка покупок'] * 10)
+        reader = PdfReader(BytesIO(self.render([line])), strict=True)
+        rows = reader.pages[0].extract_text().splitlines()
+        self.assertGreater(len(rows), 1)
+        self.assertEqual(' '.join(rows), line)
+
+    def test_empty_document_has_one_page(self):
+        reader = PdfReader(BytesIO(self.render([])), strict=True)
+        self.assertEqual(len(reader.pages), 1)
+
+
+@override_settings(**TEST_SETTINGS)
+class ProjectionsTest(TestCase):
+    """
+    Проекции recipes.projections строят тот же json, что сериализаторы:
+    сравниваются случаи команды bench_serializers.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer, *authors = User.objects.bulk_create([
+            User(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Имя', last_name=f'Фамилия {number}'
+            )
+            for number in range(4)
+        ])
+        tags = Tag.objects.bulk_create([
+            Tag(name='Завтрак', color='#E26C2D', slug='breakfast'),
+        ])
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        ])
+        recipes = create_recipes(12, authors, tags, ingredients)
+        Recipe.objects.filter(id=recipes[0].id).update(
+            image='recipes/images/first.jpg'
+        )
+        Recipe.objects.filter(id=recipes[1].id).update(
+            image='recipes/images/second.jpg', image_variants={
+                'source': 'recipes/images/second.jpg',
+                'thumbnail': 'recipes/variants/second_thumbnail.webp',
+                'detail': 'recipes/variants/second_detail.webp',
+                'original': 'recipes/variants/second_original.webp',
+            }
+        )
+        Favorite.objects.create(user=cls.viewer, recipe=recipes[2])
+        Subscription.objects.bulk_create([
+            Subscription(user=cls.viewer, author=author)
+            for author in authors[:2]
+        ])
+
+    def test_projections_match_serializers(self):
+        request = Request(RequestFactory().get('/api/'))
+        request.user = self.viewer
+        render = JSONRenderer().render
+        for name, serializer, projection in BenchSerializersCommand().cases(
+            self.viewer, request
+        ):
+            with self.subTest(name):
+                expected = serializer()
+                self.assertTrue(expected)
+                self.assertEqual(
+                    [render(item) for item in projection()],
+                    [render(item) for item in expected]
+                )
+
+
+@override_settings(**TEST_SETTINGS)
+class LoaderTest(TestCase):
+    """ Загрузка справочников командой loader. """
+
+    def setUp(self):
+        cache.set(CATALOG_VERSION_KEY, 0, timeout=None)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, path, **options):
+        call_command('loader', path=path, stdout=StringIO(), **options)
+        return cache.get(CATALOG_VERSION_KEY)
+
+    def test_reload_is_idempotent_and_bumps_catalog_once(self):
+        tags = self.write('tags.json', json.dumps([
+            {'name': 'Завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
+            {'name': 'Обед', 'color': '#49B64E', 'slug': 'lunch'},
+        ]))
+        ingredients = self.write(
+            'ingredients.csv', 'мука,г\nмолоко,мл\nмука,г\n'
+        )
+        self.assertNotEqual(self.load(tags), 0)
+        self.assertNotEqual(self.load(ingredients), 0)
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+        cache.set(CATALOG_VERSION_KEY, 0, timeout=None)
+        self.assertEqual(self.load(tags), 0)
+        self.assertEqual(self.load(ingredients), 0)
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write('ingredients.csv', 'мука,г\n')
+        self.assertEqual(self.load(path, dry_run=True), 0)
+        self.assertFalse(Ingredient.objects.exists())
@@ -1,4 +1,5 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet
@@ -12,3 +13,19 @@ router.register(r'tags', TagViewSet, basename='tags')
 urlpatterns = [
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        re_path(r'^recipes/$', async_views.recipe_list, name='recipes-list'),
+        re_path(r'^recipes/(?P<pk>\d+)/$', async_views.recipe_detail,
+                name='recipes-detail'),
+        re_path(r'^ingredients/$', async_views.ingredient_list,
+                name='ingredients-list'),
+        re_path(r'^ingredients/(?P<pk>\d+)/$', async_views.ingredient_detail,
+                name='ingredients-detail'),
+        re_path(r'^tags/$', async_views.tag_list, name='tags-list'),
+        re_path(r'^tags/(?P<pk>\d+)/$', async_views.tag_detail,
+                name='tags-detail'),
+    ] + urlpatterns
@@ -1,26 +1,17 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 
-from .models import RecipeIngredient
+from monitoring.metrics import timed_export
+from .cart import get_shopping_list
+from .exporters import EXPORTERS
 
 
-def download_shopping_list(request):
-    shopping_items = 'Cписок покупок:'
-    ingredients = RecipeIngredient.objects.filter(
-        recipe__shopping__user=request.user
-    ).values(
-        'ingredient__name', 'ingredient__measurement_unit'
-    ).annotate(counter=Sum('amount'))
-
-    for num, ingr in enumerate(ingredients):
-        shopping_items += (
-            f"\n{ingr['ingredient__name']} - "
-            f"{ingr['counter']} {ingr['ingredient__measurement_unit']}"
-        )
-        if num < ingredients.count() - 1:
-            shopping_items += ', '
-
-    file = 'shopping_list'
-    response = HttpResponse(shopping_items, 'Content-Type: application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{file}.pdf"'
+def download_shopping_list(request, file_format='pdf'):
+    exporter = EXPORTERS[file_format](get_shopping_list(request.user))
+    response = StreamingHttpResponse(
+        timed_export(exporter, file_format),
+        content_type=exporter.content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{exporter.extension}"'
+    )
     return response
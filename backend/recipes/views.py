@@ -1,35 +1,70 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import OrderingFilter
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.permissions import (SAFE_METHODS, AllowAny,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from foodgram.renderers import FastJSONRenderer
 from users.permissions import IsAuthorOrReadOnly
-from .filters import IngredientFilter, RecipeFilter
-from .mixins import AddDelMixin
+from .filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from .cache import bump_recipe_versions
+from .cart import get_cart, shopping_list
+from .mixins import AddDelMixin, CatalogCacheMixin, RecipeCacheMixin
 from .models import Favorite, Ingredient, Recipe, ShoppingList, Tag
 from .pagination import SimplePagination
+from .renderers import CSVRenderer, PDFRenderer, TXTRenderer
 from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
                           IngredientSerializer, RecipeSerializer,
                           ShoppingListSerializer, TagSerializer)
 from .utils import download_shopping_list
 
 
-class RecipeViewSet(viewsets.ModelViewSet, AddDelMixin):
+class RecipeViewSet(RecipeCacheMixin, viewsets.ModelViewSet,
+                    AddDelMixin):
     """ Отображение рецептов. """
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
-    filter_backends = (DjangoFilterBackend, OrderingFilter)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
     pagination_class = SimplePagination
+    ordering_fields = (
+        'id', 'name', 'cooking_time', 'created', 'popularity', 'trending'
+    )
+    ordering = ('-created', '-id')
+    keyset_ordering = ('-created', '-id')
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.with_user_flags(self.request.user)
+        return Recipe.objects.all()
 
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PUT', 'PATCH']:
             return CreateRecipeSerializer
         return RecipeSerializer
 
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        bump_recipe_versions([serializer.instance.id])
+
+    def perform_destroy(self, instance):
+        recipe_id = instance.id
+        super().perform_destroy(instance)
+        bump_recipe_versions([recipe_id])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """ Ошибки выгрузки списка покупок отдаются в json, а не файлом. """
+        if (self.action == 'download_shopping_cart'
+                and isinstance(response, Response)):
+            request.accepted_renderer = FastJSONRenderer()
+            request.accepted_media_type = FastJSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
     @action(detail=True, methods=['POST', 'DELETE'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
@@ -46,26 +81,62 @@ class RecipeViewSet(viewsets.ModelViewSet, AddDelMixin):
             request, pk, ShoppingListSerializer, ShoppingList
         )
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
+    @action(detail=False, methods=['POST', 'DELETE'],
+            url_path='favorite', url_name='favorite-bulk',
+            permission_classes=[IsAuthenticated])
+    def bulk_favorite(self, request):
+        """ Добавление/удаление списка рецептов из избранного. """
+        return self.bulk_add_del(
+            request, Favorite, 'recipe', Recipe.objects.all()
+        )
+
+    @action(detail=False, url_path='shopping_cart',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_totals(self, request):
+        """ Итоги списка покупок: количество каждого ингредиента. """
+        cart = get_cart(request.user)
+        return Response({
+            'recipes': len(cart['recipes']),
+            'ingredients': [
+                {
+                    'name': row['name'],
+                    'measurement_unit': row['measurement_unit'],
+                    'amount': row['total'],
+                }
+                for row in shopping_list(cart['totals'])
+            ],
+        })
+
+    @shopping_cart_totals.mapping.post
+    @shopping_cart_totals.mapping.delete
+    def bulk_shopping_cart(self, request):
+        """ Добавление/удаление списка рецептов из списка покупок. """
+        return self.bulk_add_del(
+            request, ShoppingList, 'recipe', Recipe.objects.all()
+        )
+
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            renderer_classes=[PDFRenderer, TXTRenderer, CSVRenderer])
     def download_shopping_cart(self, request):
-        """ Скачать список покупок. """
+        """ Скачать список покупок в формате pdf, txt или csv. """
         try:
-            return download_shopping_list(request)
+            return download_shopping_list(
+                request, request.accepted_renderer.format
+            )
         except ValueError:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """ Отображение ингредиентов. """
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     filter_backends = (IngredientFilter,)
-    search_fields = ['^name', ]
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """ Отображение тегов. """
 
     queryset = Tag.objects.all()
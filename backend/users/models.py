@@ -3,7 +3,7 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
 from django.db.models import (CASCADE, CharField, EmailField, F, ForeignKey,
-                              Model, Q, UniqueConstraint)
+                              Model, PositiveIntegerField, Q, UniqueConstraint)
 
 
 class User(AbstractUser):
@@ -30,12 +30,45 @@ class User(AbstractUser):
             message='Имя пользователя не соответсвует стандартам Unicode'
         )]
     )
+    recipes_count = PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    # Поля автора, которые входят в документы его рецептов.
+    PUBLIC_FIELDS = ('email', 'username', 'first_name', 'last_name')
 
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._public_values = instance.public_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._public_values = self.public_values()
+
+    def public_values(self):
+        loaded = self.get_deferred_fields()
+        return {
+            name: getattr(self, name) for name in self.PUBLIC_FIELDS
+            if name not in loaded
+        }
+
+    def public_fields_changed(self, update_fields=None):
+        """ Изменились ли публичные поля с загрузки из базы. """
+        if update_fields is not None and not (
+            set(update_fields) & set(self.PUBLIC_FIELDS)
+        ):
+            return False
+        loaded = getattr(self, '_public_values', None)
+        if loaded is None or len(loaded) < len(self.PUBLIC_FIELDS):
+            return True
+        return loaded != self.public_values()
+
 
 class Subscription(Model):
     """ Модель подписки. """
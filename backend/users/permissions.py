@@ -6,4 +6,7 @@ class IsAuthorOrReadOnly(BasePermission):
         return request.method in SAFE_METHODS or request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
-        return request.method in SAFE_METHODS or request.user == obj.author
+        return (
+            request.method in SAFE_METHODS
+            or request.user.id == obj.author_id
+        )
@@ -1,7 +1,7 @@
-from djoser.serializers import UserSerializer
 from rest_framework import serializers, status
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 
+from recipes.fields import ImageVariantsField
 from recipes.models import Recipe
 from .models import Subscription, User
 
@@ -19,6 +19,8 @@ class CustomUserSerializer(ModelSerializer):
         ]
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (
             not user.is_anonymous
@@ -29,9 +31,11 @@ class CustomUserSerializer(ModelSerializer):
 class CropRecipeSerializer(ModelSerializer):
     """ Укороченный сериализатор рецепта. """
 
+    images = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'images', 'cooking_time']
         read_only_fields = ['__all__', ]
 
 
@@ -39,34 +43,30 @@ class SubscribeSerializer(CustomUserSerializer):
     """ Сериализатор подписки. """
 
     recipes = SerializerMethodField()
-    recipes_count = SerializerMethodField()
 
-    class Meta(UserSerializer.Meta):
-        fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
+    class Meta(CustomUserSerializer.Meta):
+        fields = CustomUserSerializer.Meta.fields + [
+            'recipes', 'recipes_count'
+        ]
         read_only_fields = ['email', 'username', 'first_name', 'last_name']
 
-    def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return (not user.is_anonymous
-                and user.subscriber.filter(author=obj).exists())
-
     def get_recipes(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        recipes = obj.recipes.all()
-        limit = request.query_params.get('recipes_limit')
-        if limit:
-            try:
-                recipes = recipes[:int(limit)]
-            except ValueError:
-                pass
+        if hasattr(obj, 'recent_recipes'):
+            recipes = obj.recent_recipes
+        else:
+            recipes = obj.recipes.all()
+            limit = request.query_params.get('recipes_limit')
+            if limit:
+                try:
+                    recipes = recipes[:int(limit)]
+                except ValueError:
+                    pass
         return CropRecipeSerializer(recipes, many=True,
                                     context={'request': request}).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class SubscriptionSerializer(ModelSerializer):
     class Meta:
@@ -79,7 +79,7 @@ class SubscriptionSerializer(ModelSerializer):
     def validate(self, data):
         author = data['author']
         user = data['user']
-        if author.subscribers.filter(user=user).exists():
+        if user.subscriber.filter(author=author).exists():
             raise serializers.ValidationError(
                 'Вы уже подписаны',
                 code=status.HTTP_400_BAD_REQUEST
@@ -90,3 +90,8 @@ class SubscriptionSerializer(ModelSerializer):
                 code=status.HTTP_400_BAD_REQUEST
             )
         return data
+
+    def to_representation(self, instance):
+        return SubscribeSerializer(instance.author, context={
+            'request': self.context.get('request')
+        }).data
@@ -1,19 +1,47 @@
+from django.db import transaction
+from django.db.models import F
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.serializers import ListSerializer
 
+from recipes import projections
+from recipes.cache import get_user_flags, invalidate_user_flags
+from recipes.mixins import AddDelMixin, lock_user
+from recipes.models import Recipe
 from recipes.pagination import SimplePagination
 from .models import Subscription, User
-from .serializers import SubscribeSerializer, SubscriptionSerializer
+from .serializers import SubscriptionSerializer
 
 
-class UserViewSet(UserViewSet):
-    queryset = User.objects.all()
+class UserViewSet(AddDelMixin, UserViewSet):
+    """
+    Пользователи и подписки.
+
+    Списки строятся проекциями recipes.projections из .values(),
+    подписки текущего пользователя берутся из кэша get_user_flags.
+    """
+    queryset = User.objects.order_by('id')
     pagination_class = SimplePagination
+    keyset_ordering = ('-subscription_id',)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(
+            self.get_queryset()
+        ).values(*projections.USER.values)
+        page = self.paginate_queryset(queryset)
+        subscribed = (
+            set() if request.user.is_anonymous
+            else get_user_flags(request.user)['subscriptions']
+        )
+        data = projections.users(
+            queryset if page is None else page, subscribed
+        )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
 
     @action(
         detail=True,
@@ -24,11 +52,15 @@ class UserViewSet(UserViewSet):
         author = get_object_or_404(User, id=id)
 
         if request.method == 'POST':
-            serializer = SubscriptionSerializer(
-                context=self.get_serializer_context()
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer().save()
+            with transaction.atomic():
+                lock_user(request.user)
+                serializer = SubscriptionSerializer(
+                    data={'user': request.user.id, 'author': author.id},
+                    context=self.get_serializer_context()
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            invalidate_user_flags(request.user)
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED
@@ -36,15 +68,37 @@ class UserViewSet(UserViewSet):
         Subscription.objects.filter(
             user=request.user, author=author
         ).delete()
+        invalidate_user_flags(request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['POST', 'DELETE'],
+            url_path='subscribe', url_name='subscribe-bulk',
+            permission_classes=[IsAuthenticated])
+    def bulk_subscribe(self, request):
+        """ Подписка/отписка на список авторов. """
+        return self.bulk_add_del(
+            request, Subscription, 'author', User.objects.all(),
+            exclude={request.user.id}
+        )
+
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        queryset = User.objects.filter(author__user=request.user)
+        recipes = Recipe.objects.all()
+        try:
+            limit = int(request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            limit = None
+        if limit is not None and limit >= 0:
+            recipes = Recipe.objects.latest_per_author(limit)
+        queryset = User.objects.filter(
+            author__user=request.user
+        ).annotate(
+            subscription_id=F('author__id')
+        ).order_by(*self.keyset_ordering).values(
+            *projections.USER.values, 'recipes_count', 'subscription_id'
+        )
         authors = self.paginate_queryset(queryset)
-        serializer = ListSerializer(
-            child=SubscribeSerializer(authors),
-            context=self.get_serializer_context(),
+        return self.get_paginated_response(
+            projections.subscriptions(authors, recipes, request)
         )
-        return self.get_paginated_response(serializer.data)